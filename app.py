@@ -1,13 +1,24 @@
 import os
+import hashlib
+import hmac
+import itertools
+import json
 import logging
-from flask import Flask, render_template, request, jsonify, url_for, redirect
+import time
+from flask import Flask, request, jsonify, url_for, redirect, abort, send_file, stream_with_context, g
+from flask import render_template as flask_render_template
 from flask_caching import Cache
+from itsdangerous import BadSignature, URLSafeSerializer
 from werkzeug.middleware.proxy_fix import ProxyFix
 from urllib.parse import quote
-import pandas as pd
-from data_loader import BankDataLoader
-import re
-import requests
+from data_reload import LiveDataset
+from ifsc_cache import IFSCCache
+from ifsc_upstream import UpstreamRefresher, fetch_bank_details
+from metrics import metrics
+from payloads import PayloadCache
+from profiling import PROFILE_FORMATS, RequestProfiler
+from querylog import QueryLog
+from sitemap import SiteMap, shard_filename
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -17,54 +28,202 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+# Template rendering is timed as a stage of its own in /metrics
+render_template = metrics.timed('render')(flask_render_template)
+
 # Configure caching
 cache = Cache(app, config={'CACHE_TYPE': 'simple'})
 
-# Initialize data loader
-data_loader = BankDataLoader()
-bank_data = None
+# The loaded dataset, replaced by background reloads when its files change
+dataset = LiveDataset()
+
+# Token expected in the X-Admin-Token header of admin endpoints; unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Results rendered on a search page; only these are turned into records
+SEARCH_RESULTS_LIMIT = 100
+
+# Default and largest page size of /api/search
+API_SEARCH_LIMIT = 50
+API_SEARCH_MAX_LIMIT = 500
+
+# Codes resolved and streamed back per step of /api/ifsc/batch
+IFSC_BATCH_CHUNK = 10000
+
+# Request bodies read line by line as NDJSON by /api/ifsc/batch
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
 
 def init_data():
-    global bank_data
-    if bank_data is None:
-        bank_data = data_loader.load_data()
-    return bank_data
-
-def slugify(text):
-    """Convert text to URL-friendly slug"""
-    text = str(text).lower()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text)
-    return text.strip('-')
+    """Get the current dataset; a request keeps using the one it got even if a reload swaps it"""
+    return dataset.get()
+
+# List endpoint bodies, serialized once per dataset version
+payload_cache = PayloadCache()
+
+# Shared cache of Razorpay lookups, including codes Razorpay does not know
+ifsc_cache = IFSCCache()
+
+# Fetches Razorpay details for locally known codes off the request path
+ifsc_refresher = UpstreamRefresher(ifsc_cache)
+
+# Fields only Razorpay has, added to local records once fetched
+UPSTREAM_FIELDS = ['CONTACT', 'RTGS', 'SWIFT', 'MICR']
 
 def get_bank_details_from_razorpay(ifsc_code):
-    """Get bank details from Razorpay IFSC API"""
+    """Get bank details from Razorpay IFSC API, answering repeat lookups from the cache"""
+    ifsc_code = ifsc_code.upper()
+    found, bank_info = ifsc_cache.get(ifsc_code)
+    if found:
+        return bank_info
+    
     try:
-        url = f"https://ifsc.razorpay.com/{ifsc_code.upper()}"
-        response = requests.get(url, timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'IFSC': data.get('IFSC', ''),
-                'BANK': data.get('BANK', ''),
-                'BRANCH': data.get('BRANCH', ''),
-                'CITY1': data.get('DISTRICT', ''),
-                'CITY2': data.get('CITY', ''),
-                'STATE': data.get('STATE', ''),
-                'ADDRESS': data.get('ADDRESS', ''),
-                'PHONE': 'N/A',
-                'STD CODE': 'N/A',
-                'CONTACT': data.get('CONTACT', ''),
-                'RTGS': data.get('RTGS', False),
-                'SWIFT': data.get('SWIFT', ''),
-                'MICR': data.get('MICR', '')
-            }
-        else:
-            return None
+        bank_info = fetch_bank_details(ifsc_code)
     except Exception as e:
         logging.error(f"Error fetching from Razorpay API: {e}")
         return None
+    
+    ifsc_cache.set(ifsc_code, bank_info)
+    return bank_info
+
+def enrich_from_razorpay(bank_info):
+    """Add cached Razorpay-only fields to a local record.
+    
+    Never waits on the network: if the code is not cached, or its entry has
+    expired, it is queued for a background fetch and the record is returned
+    as it is.
+    """
+    found, upstream = ifsc_cache.get(bank_info['IFSC'])
+    if not found:
+        ifsc_refresher.enqueue(bank_info['IFSC'])
+    elif upstream:
+        bank_info = dict(bank_info)
+        for field in UPSTREAM_FIELDS:
+            bank_info[field] = upstream.get(field, '')
+        if not bank_info.get('PHONE') and upstream.get('CONTACT'):
+            bank_info['PHONE'] = upstream['CONTACT']
+    return bank_info
+
+def collect_app_metrics():
+    """Get the cache and dataset metrics for /metrics, read from their own counters"""
+    ifsc_stats = ifsc_cache.stats()
+    payload_stats = payload_cache.stats()
+    status = dataset.status
+    samples = [
+        ('ifsc_cache_lookups_total', 'counter', "Razorpay cache lookups of this process, by result",
+         [((('result', result),), ifsc_stats[result]) for result in ('hits', 'negative_hits', 'misses', 'expired')]),
+        ('ifsc_cache_errors_total', 'counter', "Razorpay cache reads and writes that failed", [((), ifsc_stats['errors'])]),
+        ('ifsc_cache_hit_ratio', 'gauge', "Share of Razorpay cache lookups answered from the cache",
+         [((), ifsc_stats['hit_ratio'])]),
+        ('payload_cache_lookups_total', 'counter', "Serialized list payload lookups of this process, by result",
+         [((('result', result),), payload_stats[result]) for result in ('hits', 'misses')]),
+        ('payload_cache_hit_ratio', 'gauge', "Share of list payloads served without serializing them",
+         [((), payload_stats['hit_ratio'])]),
+        ('dataset_info', 'gauge', "The loaded dataset version", [((('version', status['version']),), 1)]),
+        ('dataset_rows', 'gauge', "Rows of the loaded dataset", [((), status['rows'])]),
+        ('dataset_reloads_total', 'counter', "Dataset reloads swapped in since start", [((), status['reloads'])]),
+        ('dataset_reloading', 'gauge', "Whether a dataset reload is running", [((), int(status['reloading']))]),
+    ]
+    if ifsc_stats['entries'] is not None:
+        samples.append(('ifsc_cache_entries', 'gauge', "Entries in the shared Razorpay cache",
+                        [((), ifsc_stats['entries'])]))
+    if status['loaded_at'] is not None:
+        samples.append(('dataset_loaded_timestamp_seconds', 'gauge', "When the loaded dataset was swapped in",
+                        [((), status['loaded_at'])]))
+    return samples
+
+metrics.add_collector(collect_app_metrics)
+
+@app.before_request
+def start_request_metrics():
+    """Count the request as in flight and start timing it"""
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    g.metrics_started = time.perf_counter()
+    metrics.inc('http_requests_in_flight', (('endpoint', g.metrics_endpoint),))
+
+# Anonymized log of served requests for replay.py, if QUERY_LOG_PATH is set
+query_log = QueryLog()
+
+def after_body(response, finish):
+    """Call finish() once a streamed response's body is exhausted, closed or dropped.
+    
+    Flask may tear a request down before its streamed body is produced, so
+    work done while streaming is only over at this point.
+    """
+    body = response.response
+    
+    def iter_body():
+        try:
+            yield from body
+        finally:
+            close = getattr(body, 'close', None)
+            if close is not None:
+                close()
+            finish()
+    response.response = iter_body()
+
+def record_request(request_g, req, status):
+    """Record a finished request's latency and status in the metrics and query log, once"""
+    if request_g.get('metrics_recorded'):
+        return
+    request_g.metrics_recorded = True
+    elapsed = time.perf_counter() - request_g.metrics_started
+    labels = (('endpoint', request_g.metrics_endpoint),)
+    metrics.observe('http_request_duration_seconds', labels, elapsed)
+    metrics.inc('http_requests_total', labels + (('method', req.method), ('status', str(status))))
+    metrics.inc('http_requests_in_flight', labels, -1)
+    if query_log.enabled:
+        query_log.record(request_g.metrics_endpoint, req, status, elapsed, request_g.get('batch_items'))
+
+@app.after_request
+def finish_request_metrics(response):
+    """Record the request once its response is complete; streamed bodies complete after their last chunk"""
+    request_g, req, status = g._get_current_object(), request._get_current_object(), response.status_code
+    if response.is_streamed:
+        after_body(response, lambda: record_request(request_g, req, status))
+    else:
+        record_request(request_g, req, status)
+    return response
+
+@app.teardown_request
+def finish_failed_request_metrics(error):
+    """Record requests that raised before producing a response"""
+    if 'metrics_started' in g and error is not None:
+        record_request(g._get_current_object(), request._get_current_object(), 500)
+
+# Profiles requests asked for by admins, or sampled at PROFILE_SAMPLE_RATE
+request_profiler = RequestProfiler()
+
+def is_admin_request():
+    """Check the request's X-Admin-Token header against ADMIN_TOKEN"""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+@app.before_request
+def start_request_profile():
+    """Profile the request if an admin asked for it with X-Profile or ?profile, or if it is sampled"""
+    flag = request.headers.get('X-Profile') or request.args.get('profile')
+    if flag and is_admin_request():
+        g.profile_requested = True
+    elif not request_profiler.sampled():
+        return
+    g.profile = request_profiler.start(request.endpoint or 'unmatched', flag if flag in PROFILE_FORMATS else None)
+
+@app.after_request
+def add_profile_header(response):
+    """Tell an admin which file their request's profile goes to; streamed bodies are profiled to their end"""
+    profile = g.get('profile')
+    if profile:
+        if g.get('profile_requested'):
+            response.headers['X-Profile-File'] = os.path.basename(profile[1])
+        if response.is_streamed:
+            del g.profile
+            after_body(response, lambda: request_profiler.finish(profile))
+    return response
+
+@app.teardown_request
+def finish_request_profile(error):
+    profile = g.pop('profile', None)
+    if profile:
+        request_profiler.finish(profile)
 
 # Initialize data when app starts
 with app.app_context():
@@ -73,24 +232,50 @@ with app.app_context():
 @app.route('/')
 def index():
     """Homepage with search functionality"""
-    df = init_data()
+    data = init_data()
     
     # Get sample data for examples
-    sample_ifsc = df['IFSC'].iloc[0] if not df.empty else "SBIN0000001"
-    sample_bank = df['BANK'].iloc[0] if not df.empty else "STATE BANK OF INDIA"
-    sample_city = df['CITY1'].iloc[0] if not df.empty else "MUMBAI"
+    sample = data.get_sample()
+    sample_ifsc = sample['IFSC'] if sample else "SBIN0000001"
+    sample_bank = sample['BANK'] if sample else "STATE BANK OF INDIA"
+    sample_city = sample['CITY1'] if sample else "MUMBAI"
     
     return render_template('index.html', 
                          sample_ifsc=sample_ifsc,
                          sample_bank=sample_bank,
                          sample_city=sample_city,
-                         total_banks=len(df['BANK'].unique()),
-                         total_branches=len(df))
+                         total_banks=len(data.store['BANK'].table),
+                         total_branches=len(data.store))
+
+def detect_search_type(query):
+    """Guess whether a query is an IFSC code, a phone number or general text"""
+    if len(query) == 11 and query.isalnum():
+        return 'ifsc'
+    elif query.isdigit():
+        return 'phone'
+    return 'general'
+
+# Signs /api/search cursors with the app's secret key, so clients cannot forge their state
+cursor_serializer = URLSafeSerializer(app.secret_key, salt='api-search-cursor')
+
+def encode_cursor(state):
+    """Encode pagination state as an opaque, signed URL-safe token"""
+    return cursor_serializer.dumps(state)
+
+def decode_cursor(cursor):
+    """Decode a token from encode_cursor(); raises ValueError if it is malformed or not signed by this app"""
+    try:
+        state = cursor_serializer.loads(cursor)
+    except BadSignature:
+        raise ValueError("bad signature")
+    if not isinstance(state, dict):
+        raise ValueError("cursor is not an object")
+    return state
 
 @app.route('/search')
 def search():
     """Search functionality"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'auto')
     
@@ -104,26 +289,12 @@ def search():
         if not bank:
             return render_template('search_results.html', results=[], query="", error="Please enter at least a bank name")
         
-        # Filter by bank name
-        filtered_df = df[df['BANK'].str.contains(bank, case=False, na=False)]
-        
-        # Apply additional filters
-        if city:
-            filtered_df = filtered_df[
-                (filtered_df['CITY1'].str.contains(city, case=False, na=False)) |
-                (filtered_df['CITY2'].str.contains(city, case=False, na=False))
-            ]
-        
-        if state:
-            filtered_df = filtered_df[filtered_df['STATE'].str.contains(state, case=False, na=False)]
-        
-        if branch:
-            filtered_df = filtered_df[filtered_df['BRANCH'].str.contains(branch, case=False, na=False)]
-        
-        results = filtered_df.to_dict('records')
+        # Filter by bank name, then by city, state and branch if given
+        results, total = data.search_bank_details(bank, city, state, branch, limit=SEARCH_RESULTS_LIMIT)
         
         return render_template('search_results.html', 
-                             results=results[:100],  # Limit results
+                             results=results,
+                             total=total,
                              query=f"Bank: {bank}" + (f", City: {city}" if city else "") + (f", State: {state}" if state else "") + (f", Branch: {branch}" if branch else ""),
                              search_type='bank_details')
     
@@ -133,67 +304,59 @@ def search():
     
     # Auto-detect search type
     if search_type == 'auto':
-        if len(query) == 11 and query.isalnum():
-            search_type = 'ifsc'
-        elif query.isdigit():
-            search_type = 'phone'
-        else:
-            search_type = 'general'
+        search_type = detect_search_type(query)
     
-    results = []
+    results, total = [], 0
     
     if search_type == 'ifsc':
-        # For IFSC search, try exact match first
+        # If exact match found in CSV, redirect to IFSC detail page
+        if data.has_ifsc(query):
+            return redirect(url_for('ifsc_detail', ifsc_code=query.upper()))
+        
+        # Codes newer than the dataset are looked up on Razorpay; the result
+        # is cached, so the detail page does not fetch it again
         if len(query) == 11 and query.isalnum():
-            # Try Razorpay API first for exact IFSC
-            bank_info = get_bank_details_from_razorpay(query)
-            if bank_info:
+            if get_bank_details_from_razorpay(query):
                 return redirect(url_for('ifsc_detail', ifsc_code=query.upper()))
         
         # Search by IFSC code in CSV data
-        filtered_df = df[df['IFSC'].str.contains(query, case=False, na=False)]
-        results = filtered_df.to_dict('records')
-        
-        # If exact match found in CSV, redirect to IFSC detail page
-        exact_match = df[df['IFSC'] == query.upper()]
-        if len(exact_match) == 1:
-            return redirect(url_for('ifsc_detail', ifsc_code=query.upper()))
+        results, total = data.search_column('IFSC', query, limit=SEARCH_RESULTS_LIMIT)
     
     elif search_type == 'phone':
         # Search by phone number
-        filtered_df = df[df['PHONE'].astype(str).str.contains(query, na=False)]
-        results = filtered_df.to_dict('records')
+        results, total = data.search_column('PHONE', query, limit=SEARCH_RESULTS_LIMIT)
+    
+    elif search_type == 'fuzzy':
+        results, total = data.search_fuzzy(query, limit=SEARCH_RESULTS_LIMIT)
     
     else:
         # General search across multiple fields
-        filtered_df = df[
-            (df['BANK'].str.contains(query, case=False, na=False)) |
-            (df['BRANCH'].str.contains(query, case=False, na=False)) |
-            (df['CITY1'].str.contains(query, case=False, na=False)) |
-            (df['CITY2'].str.contains(query, case=False, na=False)) |
-            (df['STATE'].str.contains(query, case=False, na=False)) |
-            (df['ADDRESS'].str.contains(query, case=False, na=False))
-        ]
-        results = filtered_df.to_dict('records')
+        results, total = data.search_general(query, limit=SEARCH_RESULTS_LIMIT)
+        
+        # A misspelt query finds nothing literally; show close matches instead
+        if total == 0:
+            search_type = 'fuzzy'
+            results, total = data.search_fuzzy(query, limit=SEARCH_RESULTS_LIMIT)
     
     return render_template('search_results.html', 
-                         results=results[:100],  # Limit results
+                         results=results,
+                         total=total,
                          query=query,
                          search_type=search_type)
 
 @app.route('/ifsc/<ifsc_code>')
 def ifsc_detail(ifsc_code):
     """Show detailed information for a specific IFSC code"""
-    df = init_data()
+    data = init_data()
     
-    # Try to get bank details from Razorpay API first
-    bank_info = get_bank_details_from_razorpay(ifsc_code)
+    # The local dataset answers first; Razorpay only adds fields it lacks
+    bank_info = data.get_by_ifsc(ifsc_code)
+    if bank_info:
+        bank_info = enrich_from_razorpay(bank_info)
     
-    # If Razorpay API fails, try CSV data
+    # Codes newer than the dataset are looked up on Razorpay
     if not bank_info:
-        bank_record = df[df['IFSC'] == ifsc_code.upper()]
-        if not bank_record.empty:
-            bank_info = bank_record.iloc[0].to_dict()
+        bank_info = get_bank_details_from_razorpay(ifsc_code)
     
     # If still no data found
     if not bank_info:
@@ -202,48 +365,43 @@ def ifsc_detail(ifsc_code):
                              error="IFSC code not found")
     
     # Find related branches in the same city from CSV data
-    related_branches = df[
-        (df['BANK'].str.contains(bank_info['BANK'], case=False, na=False)) &
-        (df['CITY1'].str.contains(bank_info['CITY1'], case=False, na=False)) &
-        (df['IFSC'] != ifsc_code.upper())
-    ].head(5)
+    related_branches = data.get_related_branches(bank_info['BANK'], bank_info['CITY1'],
+                                                 exclude_ifsc=[ifsc_code])
     
     return render_template('ifsc_detail.html',
                          ifsc_code=ifsc_code,
                          bank_info=bank_info,
-                         related_branches=related_branches.to_dict('records'))
+                         related_branches=related_branches)
 
 @app.route('/bank/<bank_slug>/<city_slug>/<branch_slug>')
 def bank_branch_detail(bank_slug, city_slug, branch_slug):
     """Show detailed information for a specific bank branch"""
-    df = init_data()
+    data = init_data()
     
     # Find matching branch
-    for _, row in df.iterrows():
-        if (slugify(row['BANK']) == bank_slug and 
-            slugify(row['CITY1']) == city_slug and 
-            slugify(row['BRANCH']) == branch_slug):
-            
-            bank_info = row.to_dict()
-            
-            # Find related branches
-            related_branches = df[
-                (df['BANK'] == bank_info['BANK']) &
-                (df['CITY1'] == bank_info['CITY1']) &
-                (df['IFSC'] != bank_info['IFSC'])
-            ].head(5)
-            
-            return render_template('bank_branch.html',
-                                 bank_info=bank_info,
-                                 related_branches=related_branches.to_dict('records'))
+    bank_info = data.get_by_slugs(bank_slug, city_slug, branch_slug)
+    if bank_info is None:
+        return render_template('bank_branch.html',
+                             error="Branch not found")
+    
+    # Other IFSCs whose slugs collide with this URL are listed first
+    siblings = [record for record in data.get_slug_collisions(bank_slug, city_slug, branch_slug)
+                if record['IFSC'] != bank_info['IFSC']]
+    
+    # Find related branches
+    related_branches = data.get_related_branches(
+        bank_info['BANK'], bank_info['CITY1'],
+        exclude_ifsc=[bank_info['IFSC']] + [record['IFSC'] for record in siblings],
+        exact=True)
     
     return render_template('bank_branch.html',
-                         error="Branch not found")
+                         bank_info=bank_info,
+                         related_branches=(siblings + related_branches)[:5])
 
 @app.route('/api/autocomplete')
 def autocomplete():
     """API endpoint for autocomplete suggestions"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     
     if len(query) < 2:
@@ -252,8 +410,7 @@ def autocomplete():
     suggestions = []
     
     # IFSC suggestions
-    ifsc_matches = df[df['IFSC'].str.startswith(query.upper(), na=False)]['IFSC'].unique()
-    for ifsc in ifsc_matches[:5]:
+    for ifsc in data.suggest('ifsc', query, 5):
         suggestions.append({
             'value': ifsc,
             'label': f"{ifsc} - IFSC Code",
@@ -261,8 +418,7 @@ def autocomplete():
         })
     
     # Bank suggestions
-    bank_matches = df[df['BANK'].str.contains(query, case=False, na=False)]['BANK'].unique()
-    for bank in bank_matches[:5]:
+    for bank in data.suggest('bank', query, 5):
         suggestions.append({
             'value': bank,
             'label': f"{bank} - Bank",
@@ -270,11 +426,7 @@ def autocomplete():
         })
     
     # City suggestions
-    city1_matches = df[df['CITY1'].str.contains(query, case=False, na=False)]['CITY1'].unique()
-    city2_matches = df[df['CITY2'].str.contains(query, case=False, na=False)]['CITY2'].unique()
-    
-    all_cities = set(list(city1_matches) + list(city2_matches))
-    for city in list(all_cities)[:3]:
+    for city in data.suggest('city', query, 3):
         suggestions.append({
             'value': city,
             'label': f"{city} - City",
@@ -282,8 +434,7 @@ def autocomplete():
         })
     
     # Branch suggestions
-    branch_matches = df[df['BRANCH'].str.contains(query, case=False, na=False)]['BRANCH'].unique()
-    for branch in branch_matches[:3]:
+    for branch in data.suggest('branch', query, 3):
         suggestions.append({
             'value': branch,
             'label': f"{branch} - Branch",
@@ -292,68 +443,215 @@ def autocomplete():
     
     return jsonify(suggestions[:15])
 
+@app.route('/api/search')
+def api_search():
+    """Search branches as JSON, one page at a time.
+    
+    Takes the same parameters as /search, plus limit (page size) and cursor
+    (the next_cursor of the previous page). General and fuzzy searches page
+    through their ranking; general searches finding nothing fall back to
+    fuzzy search. The other searches list rows in file order, and page N+1
+    resumes scanning from the row where page N stopped. IFSC searches list
+    the matching codes instead of redirecting, and never consult Razorpay.
+    """
+    data = init_data()
+    search_type = request.args.get('type', 'auto')
+    limit = max(1, min(request.args.get('limit', API_SEARCH_LIMIT, type=int), API_SEARCH_MAX_LIMIT))
+    
+    if search_type == 'bank_details':
+        params = {field: request.args.get(field, '').strip() for field in ('bank', 'city', 'state', 'branch')}
+        if not params['bank']:
+            return jsonify({'error': "Please enter at least a bank name"}), 400
+        plan = data.plan_bank_details(**params)
+    else:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': "Please enter a search term"}), 400
+        if search_type == 'auto':
+            search_type = detect_search_type(query)
+        params = {'q': query}
+        columns = {'ifsc': ['IFSC'], 'phone': ['PHONE']}.get(search_type)
+        plan = [data.plan_clause(columns, query)] if columns else None
+    
+    # Ranked searches page through their ranking, the others scan rows in file order
+    ranking = None if plan is not None else 'fuzzy' if search_type == 'fuzzy' else 'relevance'
+    
+    # Cursors only resume the search they came from, on the same dataset
+    search_key = hashlib.sha1(json.dumps([search_type, params], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            state = decode_cursor(cursor)
+            start, total = int(state['position']), int(state['total'])
+            if state['search'] != search_key:
+                raise ValueError("cursor belongs to another search")
+        except (ValueError, KeyError, TypeError) as e:
+            return jsonify({'error': f"Invalid cursor: {e}"}), 400
+        if state.get('version') != data.version:
+            return jsonify({'error': "Cursor expired, the dataset has changed"}), 410
+        # Scans resume at a row, ranked searches at a rank
+        if total < 0 or not 0 <= start <= (len(data.store) if ranking is None else total):
+            return jsonify({'error': "Invalid cursor: position out of range"}), 400
+    else:
+        start, total = 0, None
+    
+    if ranking == 'relevance':
+        results, total = data.search_general(params['q'], limit, start)
+        if total == 0:
+            ranking = 'fuzzy'
+    if ranking == 'fuzzy':
+        results, total = data.search_fuzzy(params['q'], limit, start)
+    
+    if ranking is None:
+        if total is None:
+            total = data.count_matches(plan)
+        results, next_start = data.search_page(plan, limit, start)
+    else:
+        # Ranked pages are slices of the ranking, so positions are ranks
+        next_start = start + limit if start + limit < total else None
+    next_cursor = None
+    if next_start is not None:
+        next_cursor = encode_cursor({'search': search_key, 'version': data.version,
+                                     'position': next_start, 'total': total})
+    
+    return jsonify({
+        'search_type': 'fuzzy' if ranking == 'fuzzy' else search_type,
+        'total': total,
+        'results': results,
+        'next_cursor': next_cursor,
+    })
+
+def parse_batch_item(item):
+    """Get (code, error) for one /api/ifsc/batch item: a code, or an object with an "ifsc" field"""
+    if isinstance(item, dict):
+        item = item.get('ifsc', item.get('IFSC'))
+    if not isinstance(item, str):
+        return None, f"Expected an IFSC code, got {json.dumps(item)}"
+    return item.strip(), None
+
+def iter_ndjson_items(lines):
+    """Parse NDJSON lines of JSON strings, objects or bare codes into (code, error) pairs"""
+    for line in lines:
+        text = line.decode('utf-8', errors='replace').strip()
+        if not text:
+            continue
+        if text[0] not in '"{':
+            yield text, None
+            continue
+        try:
+            yield parse_batch_item(json.loads(text))
+        except ValueError as e:
+            yield None, f"Invalid JSON line: {e}"
+
+def iter_batch_results(data, items):
+    """Resolve (code, error) pairs chunk by chunk, yielding NDJSON result lines in input order"""
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, IFSC_BATCH_CHUNK))
+        if not chunk:
+            break
+        # Counted for the query log, which keeps the batch size but not the codes
+        g.batch_items = g.get('batch_items', 0) + len(chunk)
+        positions = data.resolve_ifsc_codes([code or '' for code, _ in chunk])
+        records = iter(data.store.rows(positions[positions >= 0]))
+        
+        lines = []
+        for (code, error), position in zip(chunk, positions.tolist()):
+            if error:
+                result = {'ifsc': code, 'found': False, 'error': error}
+            elif position < 0:
+                result = {'ifsc': code, 'found': False}
+            else:
+                result = {'ifsc': code, 'found': True, 'branch': next(records)}
+            lines.append(json.dumps(result))
+        yield '\n'.join(lines) + '\n'
+
+@app.route('/api/ifsc/batch', methods=['POST'])
+def api_ifsc_batch():
+    """Resolve a batch of IFSC codes against the local dataset.
+    
+    The body is a JSON array of codes (or of objects with an "ifsc" field),
+    an object with such an array under "codes", or NDJSON with one code per
+    line. Results stream back as NDJSON, one line per code in input order,
+    with "found": false for unknown codes. Razorpay is never consulted.
+    """
+    data = init_data()
+    
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = iter_ndjson_items(request.stream)
+    else:
+        try:
+            body = json.loads(request.get_data())
+        except ValueError as e:
+            return jsonify({'error': f"Invalid JSON: {e}"}), 400
+        if isinstance(body, dict):
+            body = body.get('codes')
+        if not isinstance(body, list):
+            return jsonify({'error': "Expected a list of IFSC codes"}), 400
+        items = (parse_batch_item(item) for item in body)
+    
+    return app.response_class(
+        response=stream_with_context(iter_batch_results(data, items)),
+        status=200,
+        mimetype='application/x-ndjson'
+    )
+
 @app.route('/api/banks')
 def get_banks():
     """Get list of all banks"""
-    df = init_data()
-    banks = sorted(df['BANK'].unique())
-    return jsonify(banks)
+    data = init_data()
+    payload = payload_cache.get(data.version, 'banks', data.get_unique_banks)
+    return payload.respond(request, app.response_class)
 
 @app.route('/api/cities')
 def get_cities():
     """Get list of all cities"""
-    df = init_data()
-    cities = set()
-    cities.update(df['CITY1'].unique())
-    cities.update(df['CITY2'].unique())
-    return jsonify(sorted(list(cities)))
+    data = init_data()
+    payload = payload_cache.get(data.version, 'cities', data.get_unique_cities)
+    return payload.respond(request, app.response_class)
 
 @app.route('/api/states')
 def get_states():
     """Get list of all states"""
-    df = init_data()
-    states = sorted(df['STATE'].unique())
-    return jsonify(states)
+    data = init_data()
+    payload = payload_cache.get(data.version, 'states', data.get_unique_states)
+    return payload.respond(request, app.response_class)
 
 @app.route('/api/dynamic_banks')
 def get_dynamic_banks():
     """Get banks for dynamic autocomplete"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     
     if not query or len(query) < 2:
         return jsonify([])
     
     # Search for banks matching the query
-    filtered_banks = df[df['BANK'].str.contains(query, case=False, na=False)]['BANK'].unique()
-    results = [{'label': bank, 'value': bank, 'type': 'bank'} for bank in sorted(filtered_banks)[:10]]
+    filtered_banks = data.get_facet_values('bank', query, {})
+    results = [{'label': bank, 'value': bank, 'type': 'bank'} for bank in filtered_banks]
     
     return jsonify(results)
 
 @app.route('/api/dynamic_states')
 def get_dynamic_states():
     """Get states for dynamic autocomplete"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     bank = request.args.get('bank', '').strip()
     
     if not query or len(query) < 2:
         return jsonify([])
     
-    # Filter by bank if provided
-    if bank:
-        df = df[df['BANK'].str.contains(bank, case=False, na=False)]
-    
-    # Search for states matching the query
-    filtered_states = df[df['STATE'].str.contains(query, case=False, na=False)]['STATE'].unique()
-    results = [{'label': state, 'value': state, 'type': 'state'} for state in sorted(filtered_states)[:10]]
+    # Search for states matching the query, within the bank if provided
+    filtered_states = data.get_facet_values('state', query, {'bank': bank})
+    results = [{'label': state, 'value': state, 'type': 'state'} for state in filtered_states]
     
     return jsonify(results)
 
 @app.route('/api/dynamic_cities')
 def get_dynamic_cities():
     """Get cities for dynamic autocomplete"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     bank = request.args.get('bank', '').strip()
     state = request.args.get('state', '').strip()
@@ -361,34 +659,16 @@ def get_dynamic_cities():
     if not query or len(query) < 2:
         return jsonify([])
     
-    # Filter by bank and state if provided
-    if bank:
-        df = df[df['BANK'].str.contains(bank, case=False, na=False)]
-    if state:
-        df = df[df['STATE'].str.contains(state, case=False, na=False)]
-    
-    # Search for cities matching the query
-    city_matches = df[
-        (df['CITY1'].str.contains(query, case=False, na=False)) |
-        (df['CITY2'].str.contains(query, case=False, na=False))
-    ]
-    
-    cities = []
-    for _, row in city_matches.iterrows():
-        if row['CITY1'] and query.lower() in row['CITY1'].lower():
-            cities.append(row['CITY1'])
-        if row['CITY2'] and query.lower() in row['CITY2'].lower():
-            cities.append(row['CITY2'])
-    
-    unique_cities = sorted(list(set(cities)))
-    results = [{'label': city, 'value': city, 'type': 'city'} for city in unique_cities[:10]]
+    # Search for cities matching the query, within the bank and state if provided
+    unique_cities = data.get_facet_values('city', query, {'bank': bank, 'state': state})
+    results = [{'label': city, 'value': city, 'type': 'city'} for city in unique_cities]
     
     return jsonify(results)
 
 @app.route('/api/dynamic_branches')
 def get_dynamic_branches():
     """Get branches for dynamic autocomplete"""
-    df = init_data()
+    data = init_data()
     query = request.args.get('q', '').strip()
     bank = request.args.get('bank', '').strip()
     state = request.args.get('state', '').strip()
@@ -397,64 +677,36 @@ def get_dynamic_branches():
     if not query or len(query) < 2:
         return jsonify([])
     
-    # Filter by bank, state, and city if provided
-    if bank:
-        df = df[df['BANK'].str.contains(bank, case=False, na=False)]
-    if state:
-        df = df[df['STATE'].str.contains(state, case=False, na=False)]
-    if city:
-        df = df[
-            (df['CITY1'].str.contains(city, case=False, na=False)) |
-            (df['CITY2'].str.contains(city, case=False, na=False))
-        ]
-    
-    # Search for branches matching the query
-    filtered_branches = df[df['BRANCH'].str.contains(query, case=False, na=False)]['BRANCH'].unique()
-    results = [{'label': branch, 'value': branch, 'type': 'branch'} for branch in sorted(filtered_branches)[:10]]
+    # Search for branches matching the query, within the bank, state and city if provided
+    filtered_branches = data.get_facet_values('branch', query, {'bank': bank, 'state': state, 'city': city})
+    results = [{'label': branch, 'value': branch, 'type': 'branch'} for branch in filtered_branches]
     
     return jsonify(results)
 
+@app.route('/api/admin/reload', methods=['GET', 'POST'])
+def admin_reload():
+    """Reload the dataset in the background (POST) or report reload status (GET)"""
+    if not ADMIN_TOKEN:
+        abort(404)
+    if not is_admin_request():
+        return jsonify({'error': "Invalid admin token"}), 403
+    
+    init_data()
+    if request.method == 'POST':
+        started = dataset.reload()
+        return jsonify(dict(dataset.status, started=started)), 202
+    return jsonify(dataset.status)
+
 @app.route('/sitemap.xml')
-@cache.cached(timeout=3600)
+# Keyed by dataset version, so a reload never serves the previous shard count
+@cache.cached(timeout=3600, key_prefix=lambda: f"sitemap-{init_data().version}")
 def sitemap():
-    """Generate sitemap"""
-    df = init_data()
-    
-    sitemap_xml = '''<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-    <url>
-        <loc>https://bankbranchfinder.com/</loc>
-        <lastmod>2024-01-01</lastmod>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-'''
-    
-    # Add IFSC pages
-    for ifsc in df['IFSC'].unique():
-        sitemap_xml += f'''    <url>
-        <loc>https://bankbranchfinder.com/ifsc/{ifsc}</loc>
-        <lastmod>2024-01-01</lastmod>
-        <changefreq>monthly</changefreq>
-        <priority>0.8</priority>
-    </url>
-'''
-    
-    # Add bank branch pages
-    for _, row in df.iterrows():
-        bank_slug = slugify(row['BANK'])
-        city_slug = slugify(row['CITY1'])
-        branch_slug = slugify(row['BRANCH'])
-        
-        sitemap_xml += f'''    <url>
-        <loc>https://bankbranchfinder.com/bank/{bank_slug}/{city_slug}/{branch_slug}</loc>
-        <lastmod>2024-01-01</lastmod>
-        <changefreq>monthly</changefreq>
-        <priority>0.7</priority>
-    </url>
-'''
+    """Generate the sitemap index"""
+    data = init_data()
+    site_map = SiteMap(data)
     
-    sitemap_xml += '</urlset>'
+    sitemap_xml = ''.join(site_map.iter_index(
+        lambda number: f"{site_map.base_url}/sitemaps/sitemap-{number}.xml"))
     
     response = app.response_class(
         response=sitemap_xml,
@@ -463,12 +715,44 @@ def sitemap():
     )
     return response
 
+@app.route('/sitemaps/sitemap-<int:number>.xml')
+def sitemap_shard(number):
+    """Serve one child sitemap, prebuilt and gzipped if the snapshot has it, else streamed"""
+    data = init_data()
+    site_map = SiteMap(data)
+    if not 1 <= number <= site_map.shard_count():
+        abort(404)
+    
+    if data.sitemap_dir and 'gzip' in request.accept_encodings:
+        path = os.path.join(data.sitemap_dir, shard_filename(number))
+        if os.path.exists(path):
+            response = send_file(path, mimetype='application/xml', conditional=True)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.vary.add('Accept-Encoding')
+            return response
+    
+    return app.response_class(
+        response=site_map.iter_shard(number),
+        status=200,
+        mimetype='application/xml'
+    )
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Expose request, stage, cache and dataset metrics in the Prometheus text format"""
+    return app.response_class(
+        response=metrics.render(),
+        status=200,
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
 @app.route('/robots.txt')
 def robots():
     """Generate robots.txt"""
     robots_txt = '''User-agent: *
 Allow: /
 Disallow: /api/
+Disallow: /metrics
 
 Sitemap: https://bankbranchfinder.com/sitemap.xml
 '''
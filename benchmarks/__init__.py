@@ -0,0 +1,8 @@
+"""Reproducible benchmarks on a generated dataset at the scale of the RBI IFSC list.
+
+Run from the repository root:
+    
+    python -m benchmarks.generate [--rows 170000] [--output benchmarks/data]
+    python -m benchmarks.run [--save benchmarks/baseline.json]
+    python -m benchmarks.run --compare benchmarks/baseline.json
+"""
@@ -0,0 +1,241 @@
+"""Deterministic generator of a bank branch dataset at RBI scale.
+
+Writes bank_data_1.csv and bank_data_2.csv with about 170,000 branches in
+the layout of the real files. Branch counts per bank follow the published
+networks of the large banks plus a long tail of co-operative and regional
+rural banks; branches cluster in the populous states and in each state's
+larger districts. A small share of rows is messy like the real data: blank
+phones, stray whitespace, lower-case codes and repeated IFSC codes. The same
+seed always gives byte-identical files.
+    
+    python -m benchmarks.generate [--rows 170000] [--seed 1] [--output benchmarks/data]
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+# Columns of the generated files, in the order of the real ones
+COLUMNS = ['BANK', 'IFSC', 'BRANCH', 'ADDRESS', 'CITY1', 'CITY2', 'STATE', 'STD CODE', 'PHONE']
+
+ROWS = 170000
+SEED = 1
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# File recording the rows and seed a data directory was generated with
+GENERATED = 'generated.json'
+
+# (bank, IFSC bank code, approximate branches) of the largest banks
+BANKS = [
+    ('STATE BANK OF INDIA', 'SBIN', 22500), ('PUNJAB NATIONAL BANK', 'PUNB', 10100),
+    ('CANARA BANK', 'CNRB', 9700), ('BANK OF BARODA', 'BARB', 8200),
+    ('UNION BANK OF INDIA', 'UBIN', 8500), ('HDFC BANK', 'HDFC', 6900),
+    ('ICICI BANK LIMITED', 'ICIC', 5900), ('INDIAN BANK', 'IDIB', 5800),
+    ('BANK OF INDIA', 'BKID', 5100), ('AXIS BANK', 'UTIB', 4900),
+    ('CENTRAL BANK OF INDIA', 'CBIN', 4500), ('INDIAN OVERSEAS BANK', 'IOBA', 3200),
+    ('UCO BANK', 'UCBA', 3100), ('INDUSIND BANK', 'INDB', 2600),
+    ('BANK OF MAHARASHTRA', 'MAHB', 2200), ('IDBI BANK', 'IBKL', 2000),
+    ('KOTAK MAHINDRA BANK LIMITED', 'KKBK', 1900), ('BANDHAN BANK LIMITED', 'BDBL', 1600),
+    ('PUNJAB AND SIND BANK', 'PSIB', 1500), ('FEDERAL BANK', 'FDRL', 1400),
+    ('YES BANK', 'YESB', 1200), ('JAMMU AND KASHMIR BANK LIMITED', 'JAKA', 1000),
+    ('AU SMALL FINANCE BANK LIMITED', 'AUBL', 1000), ('SOUTH INDIAN BANK', 'SIBL', 950),
+    ('KARNATAKA BANK LIMITED', 'KARB', 920), ('IDFC FIRST BANK LTD', 'IDFB', 900),
+    ('EQUITAS SMALL FINANCE BANK LIMITED', 'ESFB', 880), ('KARUR VYSYA BANK', 'KVBL', 800),
+    ('CITY UNION BANK LIMITED', 'CIUB', 750), ('UJJIVAN SMALL FINANCE BANK LIMITED', 'UJVN', 700),
+    ('TAMILNAD MERCANTILE BANK LIMITED', 'TMBL', 550), ('RBL BANK LIMITED', 'RATN', 520),
+    ('DCB BANK LIMITED', 'DCBL', 430), ('SARASWAT COOPERATIVE BANK LIMITED', 'SRCB', 300),
+    ('CSB BANK LIMITED', 'CSBK', 700), ('DHANLAXMI BANK', 'DLXB', 250),
+]
+
+# Share of rows going to the long tail of small banks
+SMALL_BANK_SHARE = 0.14
+
+# Small banks in the tail, and the words their names are made from
+SMALL_BANKS = 1300
+SMALL_BANK_KINDS = ['CO-OPERATIVE BANK LIMITED', 'URBAN CO-OPERATIVE BANK LIMITED', 'SAHAKARI BANK LIMITED',
+                    'DISTRICT CENTRAL CO-OPERATIVE BANK LIMITED', 'GRAMIN BANK', 'NAGARIK SAHAKARI BANK LIMITED',
+                    'MERCANTILE CO-OPERATIVE BANK LIMITED', 'STATE CO-OPERATIVE BANK LIMITED']
+
+# (state, relative branch weight, STD code prefix, real cities)
+STATES = [
+    ('UTTAR PRADESH', 17, '5', ['LUCKNOW', 'KANPUR', 'VARANASI', 'AGRA', 'PRAYAGRAJ', 'GHAZIABAD', 'MEERUT', 'NOIDA']),
+    ('MAHARASHTRA', 14, '2', ['MUMBAI', 'PUNE', 'NAGPUR', 'NASHIK', 'AURANGABAD', 'THANE', 'KOLHAPUR', 'SOLAPUR']),
+    ('TAMIL NADU', 11, '4', ['CHENNAI', 'COIMBATORE', 'MADURAI', 'TIRUCHIRAPPALLI', 'SALEM', 'TIRUNELVELI', 'VELLORE']),
+    ('KARNATAKA', 10, '8', ['BENGALURU', 'MYSURU', 'MANGALURU', 'HUBBALLI', 'BELAGAVI', 'KALABURAGI', 'DAVANGERE']),
+    ('ANDHRA PRADESH', 7, '8', ['VISAKHAPATNAM', 'VIJAYAWADA', 'GUNTUR', 'NELLORE', 'KURNOOL', 'TIRUPATI']),
+    ('GUJARAT', 7, '2', ['AHMEDABAD', 'SURAT', 'VADODARA', 'RAJKOT', 'BHAVNAGAR', 'JAMNAGAR', 'GANDHINAGAR']),
+    ('WEST BENGAL', 7, '3', ['KOLKATA', 'HOWRAH', 'DURGAPUR', 'ASANSOL', 'SILIGURI', 'BARDHAMAN']),
+    ('RAJASTHAN', 6, '1', ['JAIPUR', 'JODHPUR', 'UDAIPUR', 'KOTA', 'AJMER', 'BIKANER']),
+    ('KERALA', 6, '4', ['THIRUVANANTHAPURAM', 'KOCHI', 'KOZHIKODE', 'THRISSUR', 'KOLLAM', 'KANNUR']),
+    ('MADHYA PRADESH', 6, '7', ['BHOPAL', 'INDORE', 'JABALPUR', 'GWALIOR', 'UJJAIN', 'SAGAR']),
+    ('TELANGANA', 5, '8', ['HYDERABAD', 'WARANGAL', 'NIZAMABAD', 'KARIMNAGAR', 'KHAMMAM']),
+    ('BIHAR', 5, '6', ['PATNA', 'GAYA', 'BHAGALPUR', 'MUZAFFARPUR', 'DARBHANGA']),
+    ('PUNJAB', 4, '1', ['LUDHIANA', 'AMRITSAR', 'JALANDHAR', 'PATIALA', 'BATHINDA']),
+    ('ODISHA', 4, '6', ['BHUBANESWAR', 'CUTTACK', 'ROURKELA', 'BERHAMPUR', 'SAMBALPUR']),
+    ('HARYANA', 4, '1', ['GURUGRAM', 'FARIDABAD', 'PANIPAT', 'AMBALA', 'HISAR']),
+    ('DELHI', 3, '1', ['NEW DELHI', 'DELHI']),
+    ('ASSAM', 2, '3', ['GUWAHATI', 'SILCHAR', 'DIBRUGARH', 'JORHAT']),
+    ('JHARKHAND', 2, '6', ['RANCHI', 'JAMSHEDPUR', 'DHANBAD', 'BOKARO']),
+    ('CHHATTISGARH', 2, '7', ['RAIPUR', 'BHILAI', 'BILASPUR', 'KORBA']),
+    ('UTTARAKHAND', 1, '1', ['DEHRADUN', 'HARIDWAR', 'HALDWANI', 'ROORKEE']),
+    ('HIMACHAL PRADESH', 1, '1', ['SHIMLA', 'MANDI', 'SOLAN', 'DHARAMSHALA']),
+    ('JAMMU AND KASHMIR', 1, '1', ['SRINAGAR', 'JAMMU', 'ANANTNAG']),
+    ('GOA', 1, '8', ['PANAJI', 'MARGAO', 'VASCO DA GAMA']),
+]
+
+# Districts generated per state on top of its real cities, and the towns of each
+DISTRICTS_PER_STATE = 30
+TOWNS_PER_DISTRICT = 20
+
+# Pieces of generated place names
+NAME_STARTS = ['RAM', 'SITA', 'DEV', 'CHAND', 'HAR', 'RAJ', 'SHIV', 'NAND', 'KRISHNA', 'BHAW', 'MAN', 'GOPAL',
+               'LAKSH', 'SUR', 'KAR', 'BAL', 'VIJAY', 'MAL', 'KAN', 'SHRI', 'PRAT', 'ANAND', 'JAI', 'BHIM']
+NAME_MIDDLES = ['', '', '', 'A', 'I', 'U', 'NA', 'RA', 'LA', 'WA', 'DA', 'MA']
+NAME_ENDS = ['PUR', 'NAGAR', 'GANJ', 'GARH', 'ABAD', 'PALLI', 'PET', 'KOT', 'WADI', 'GAON', 'HALLI', 'PURAM',
+             'KHED', 'NER', 'GUDI', 'PADA', 'UR', 'VALASA']
+
+# Pieces of branch names and addresses
+LOCALITIES = ['MAIN ROAD', 'MG ROAD', 'STATION ROAD', 'CIVIL LINES', 'SADAR BAZAR', 'GANDHI NAGAR', 'NEHRU NAGAR',
+              'INDUSTRIAL ESTATE', 'MARKET YARD', 'BUS STAND', 'COLLEGE ROAD', 'HOSPITAL ROAD', 'OLD TOWN',
+              'NEW TOWN', 'CANTONMENT', 'CHOWK', 'RAILWAY COLONY', 'AGRICULTURAL MARKET', 'TEMPLE STREET',
+              'SECTOR 5', 'SECTOR 12', 'PHASE II', 'BYPASS ROAD', 'KRISHI UPAJ MANDI']
+BRANCH_KINDS = ['', '', '', ' BRANCH', ' MAIN BRANCH', ' EXTENSION COUNTER', ' SME BRANCH', ' RURAL BRANCH']
+BUILDINGS = ['GROUND FLOOR', 'FIRST FLOOR', 'SHOP NO', 'PLOT NO', 'DOOR NO', 'H NO', 'SURVEY NO']
+
+def base36(number):
+    digits = ''
+    while True:
+        number, digit = divmod(number, 36)
+        digits = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'[digit] + digits
+        if not number:
+            return digits
+
+def place_name(rng):
+    return rng.choice(NAME_STARTS) + rng.choice(NAME_MIDDLES) + rng.choice(NAME_ENDS)
+
+def make_places(rng):
+    """Get (state, state STD prefix, [(district, STD code, towns)]) for every state"""
+    states = []
+    for state, _, std_prefix, cities in STATES:
+        districts = []
+        names = list(cities)
+        while len(names) < len(cities) + DISTRICTS_PER_STATE:
+            name = place_name(rng)
+            if name not in names:
+                names.append(name)
+        for name in names:
+            towns = [name] + [place_name(rng) for _ in range(TOWNS_PER_DISTRICT - 1)]
+            std_code = std_prefix + str(rng.randint(10, 999))
+            districts.append((name, std_code, towns))
+        states.append((state, std_prefix, districts))
+    return states
+
+def make_banks(rng):
+    """Get (bank, bank code, weight) of every bank, large and small"""
+    banks = list(BANKS)
+    codes = {code for _, code, _ in banks}
+    names = {name for name, _, _ in banks}
+    tail_rows = sum(weight for _, _, weight in BANKS) * SMALL_BANK_SHARE / (1 - SMALL_BANK_SHARE)
+    # Zipf-like weights for the tail: a few larger co-operatives, many tiny ones
+    harmonic = sum(1 / rank for rank in range(1, SMALL_BANKS + 1))
+    rank = 1
+    while rank <= SMALL_BANKS:
+        name = f"{place_name(rng)} {rng.choice(SMALL_BANK_KINDS)}"
+        code = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))
+        if name in names or code in codes:
+            continue
+        names.add(name)
+        codes.add(code)
+        banks.append((name, code, tail_rows / harmonic / rank))
+        rank += 1
+    return banks
+
+def generate_rows(rows=ROWS, seed=SEED):
+    """Generate the dataset rows, as lists of column values"""
+    rng = random.Random(seed)
+    places = make_places(rng)
+    banks = make_banks(rng)
+    state_weights = [weight for _, weight, _, _ in STATES]
+    bank_weights = [weight for _, _, weight in banks]
+    # Larger districts come first and get more branches
+    district_weights = [list(itertools.accumulate(1 / (rank + 2) for rank in range(len(districts))))
+                        for _, _, districts in places]
+    
+    bank_choices = rng.choices(range(len(banks)), bank_weights, k=rows)
+    state_choices = rng.choices(range(len(places)), state_weights, k=rows)
+    branch_numbers = {}
+    result = []
+    for bank_slot, state_slot in zip(bank_choices, state_choices):
+        bank, bank_code, _ = banks[bank_slot]
+        state, _, districts = places[state_slot]
+        district, std_code, towns = rng.choices(districts, cum_weights=district_weights[state_slot])[0]
+        town = towns[0] if rng.random() < 0.6 else rng.choice(towns)
+        
+        number = branch_numbers.get(bank_code, 0) + 1
+        branch_numbers[bank_code] = number
+        # Most branch codes are numbers, some start with a letter of the town
+        ifsc = f"{bank_code}0{number:06d}" if rng.random() < 0.9 else f"{bank_code}0{town[0]}{base36(number):0>5}"
+        
+        locality = rng.choice(LOCALITIES)
+        if rng.random() < 0.45:
+            branch = town + rng.choice(BRANCH_KINDS)
+        elif rng.random() < 0.7:
+            branch = f"{locality} {town}"
+        else:
+            branch = locality
+        address = (f"{rng.choice(BUILDINGS)} {rng.randint(1, 999)}, {locality}, {town}, "
+                   f"DIST {district}, {state} {rng.randint(110001, 855999)}")
+        phone = '' if rng.random() < 0.35 else str(rng.randint(2000000, 9999999))
+        result.append([bank, ifsc, branch, address, district, town, state, std_code, phone])
+    
+    # Messy rows: stray whitespace, lower-case codes and repeated codes
+    for row in rng.sample(result, rows // 500):
+        row[2] = f" {row[2]} "
+    for row in rng.sample(result, rows // 1000):
+        row[1] = row[1].lower()
+    for row in rng.sample(result, rows // 1000):
+        result.append(list(row))
+    return result
+
+def write_dataset(output=OUTPUT_DIR, rows=ROWS, seed=SEED):
+    """Write bank_data_1.csv and bank_data_2.csv into output; returns the rows written"""
+    data = generate_rows(rows, seed)
+    os.makedirs(output, exist_ok=True)
+    half = len(data) // 2
+    for name, part in (('bank_data_1.csv', data[:half]), ('bank_data_2.csv', data[half:])):
+        with open(os.path.join(output, name), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(part)
+    with open(os.path.join(output, GENERATED), 'w') as f:
+        json.dump({'rows': rows, 'seed': seed}, f)
+    return len(data)
+
+def is_generated(output, rows=ROWS, seed=SEED):
+    """Check whether output holds a dataset generated with rows and seed"""
+    try:
+        with open(os.path.join(output, GENERATED)) as f:
+            return json.load(f) == {'rows': rows, 'seed': seed}
+    except (OSError, ValueError):
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic bank branch dataset at RBI scale")
+    parser.add_argument('--rows', type=int, default=ROWS, help="branches to generate")
+    parser.add_argument('--seed', type=int, default=SEED, help="random seed; the same seed gives the same files")
+    parser.add_argument('--output', default=OUTPUT_DIR, help="directory to write the CSV files to")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    started = time.time()
+    written = write_dataset(args.output, args.rows, args.seed)
+    logging.info(f"Wrote {written} rows to {args.output} in {time.time() - started:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,327 @@
+"""Time data loading, every route of app.py and the BankDataProcessor methods.
+
+Runs against the generated dataset in benchmarks/data, generating it first
+if it is missing or was made with other settings. Razorpay lookups go to an
+in-process razorpay_stub server, so nothing leaves the machine. Each case
+runs at least a few times and then until its time budget is spent; the
+first run is reported apart since it includes cold caches.
+
+Results can be saved as a JSON baseline, and a later run compared against
+it: cases whose median slowed down by more than the threshold (and by more
+than a small absolute amount, to ignore timer noise) are flagged as
+regressions and make the run exit with status 1.
+    
+    python -m benchmarks.run [--save benchmarks/baseline.json]
+    python -m benchmarks.run --compare benchmarks/baseline.json [--threshold 0.25]
+    python -m benchmarks.run --only /search --compare benchmarks/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer
+from urllib.parse import quote
+from benchmarks import generate
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds spent repeating a case after its first run, and its fewest and most runs
+CASE_BUDGET = 1.0
+MIN_RUNS = 5
+MAX_RUNS = 500
+
+# Runs of the cases that load the whole dataset, which take seconds each
+LOAD_RUNS = 3
+
+# Slowdown of the median flagged as a regression, relative and in milliseconds
+THRESHOLD = 0.25
+NOISE_MS = 0.5
+
+# Distinct branches the query variants of each case are taken from
+SAMPLES = 8
+
+# Statuses a benchmarked request may answer with
+OK_STATUSES = (200, 302)
+
+def measure(func, variants, budget=CASE_BUDGET, min_runs=MIN_RUNS, max_runs=MAX_RUNS):
+    """Call func on each of variants in turn; returns timing statistics in milliseconds"""
+    times = []
+    started = time.perf_counter()
+    for run in range(max_runs):
+        variant = variants[run % len(variants)]
+        begin = time.perf_counter()
+        func(variant)
+        times.append((time.perf_counter() - begin) * 1000)
+        if run + 1 >= min_runs and time.perf_counter() - started >= budget:
+            break
+    
+    ordered = sorted(times)
+    stats = {
+        'runs': len(times),
+        'first_ms': times[0],
+        'min_ms': ordered[0],
+        'median_ms': statistics.median(ordered),
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'mean_ms': statistics.fmean(times),
+    }
+    return {key: round(value, 3) if key != 'runs' else value for key, value in stats.items()}
+
+def misspell(word):
+    """Drop the middle letter of word, turning it into a typo"""
+    middle = len(word) // 2
+    return word[:middle] + word[middle + 1:]
+
+def sample_branches(data, seed):
+    """Get (IFSC record, slug triple) pairs of SAMPLES branches picked by seed"""
+    rng = random.Random(seed)
+    codes = rng.sample(range(data.count_ifsc_codes()), SAMPLES)
+    slugs = rng.sample(range(data.count_branch_slugs()), SAMPLES)
+    records = [data.get_by_ifsc(next(data.iter_ifsc_codes(slot, slot + 1))) for slot in codes]
+    triples = [next(data.iter_branch_slugs(slot, slot + 1)) for slot in slugs]
+    return list(zip(records, triples))
+
+def route_cases(client, branches):
+    """Get (name, func, variants) of the app route cases"""
+    records = [record for record, _ in branches]
+    phones = [record['PHONE'][:5] for record in records if record['PHONE']] or ['12345']
+    
+    def get(url):
+        response = client.get(url)
+        response.get_data()
+        assert response.status_code in OK_STATUSES, (url, response.status_code)
+    
+    def post(body):
+        response = client.post('/api/ifsc/batch', json=body)
+        response.get_data()
+        assert response.status_code in OK_STATUSES, response.status_code
+    
+    def urls(template, **values):
+        return [template.format(**{key: quote(value(record)) for key, value in values.items()}) for record in records]
+    
+    first_word = lambda column: lambda record: record[column].split()[0]
+    prefix = lambda column: lambda record: record[column][:3]
+    field = lambda column: lambda record: record[column]
+    
+    cases = [
+        ('/', get, ['/']),
+        ('/search?type=general bank', get, urls('/search?q={q}', q=field('BANK'))),
+        ('/search?type=general city', get, urls('/search?q={q}', q=field('CITY1'))),
+        ('/search?type=general word', get, urls('/search?q={q}', q=first_word('BRANCH'))),
+        ('/search?type=general misspelt', get, urls('/search?q={q}', q=lambda record: misspell(record['CITY1']))),
+        ('/search?type=ifsc exact', get, urls('/search?q={q}', q=field('IFSC'))),
+        ('/search?type=ifsc partial', get, urls('/search?q={q}&type=ifsc', q=lambda record: record['IFSC'][:6])),
+        ('/search?type=ifsc razorpay', get, urls('/search?q={q}', q=lambda record: record['IFSC'][:4] + '0ZZZZZZ')),
+        ('/search?type=phone', get, [f'/search?q={phone}&type=phone' for phone in phones]),
+        ('/search?type=bank_details', get,
+         urls('/search?type=bank_details&bank={bank}&city={city}', bank=field('BANK'), city=field('CITY1'))),
+        ('/search?type=fuzzy', get, urls('/search?q={q}&type=fuzzy', q=lambda record: misspell(record['BANK']))),
+        ('/ifsc/<code>', get, urls('/ifsc/{code}', code=field('IFSC'))),
+        ('/bank/<bank>/<city>/<branch>', get, ['/bank/{}/{}/{}'.format(*triple) for _, triple in branches]),
+        ('/api/autocomplete', get, urls('/api/autocomplete?q={q}', q=lambda record: record['CITY1'][:4])),
+        ('/api/search general', get, urls('/api/search?q={q}', q=field('CITY1'))),
+        ('/api/search bank_details', get,
+         urls('/api/search?type=bank_details&bank={bank}&state={state}', bank=field('BANK'), state=field('STATE'))),
+        ('/api/ifsc/batch', post, [[record['IFSC'] for record in records] * 125]),
+        ('/api/banks', get, ['/api/banks']),
+        ('/api/cities', get, ['/api/cities']),
+        ('/api/states', get, ['/api/states']),
+        ('/api/dynamic_banks', get, urls('/api/dynamic_banks?q={q}', q=prefix('BANK'))),
+        ('/api/dynamic_states', get, urls('/api/dynamic_states?q={q}&bank={bank}', q=prefix('STATE'), bank=field('BANK'))),
+        ('/api/dynamic_cities', get, urls('/api/dynamic_cities?q={q}&bank={bank}&state={state}',
+                                          q=prefix('CITY1'), bank=field('BANK'), state=field('STATE'))),
+        ('/api/dynamic_branches', get, urls('/api/dynamic_branches?q={q}&bank={bank}&state={state}&city={city}',
+                                            q=prefix('BRANCH'), bank=field('BANK'), state=field('STATE'),
+                                            city=field('CITY1'))),
+        ('/sitemap.xml', get, ['/sitemap.xml']),
+        ('/sitemaps/sitemap-1.xml', get, ['/sitemaps/sitemap-1.xml']),
+        ('/robots.txt', get, ['/robots.txt']),
+    ]
+    return [(f'route {name}', func, variants) for name, func, variants in cases]
+
+def processor_cases(processor, branches):
+    """Get (name, func, variants) of the BankDataProcessor method cases"""
+    records = [record for record, _ in branches]
+    # BankDataProcessor keys its pages by the slugs of its own create_slug, city from CITY2
+    triples = [tuple(processor.create_slug(record[col]) for col in ('BANK', 'CITY2', 'BRANCH')) for record in records]
+    missing = [triple for triple in triples if processor.get_by_bank_city_branch(*triple) is None]
+    assert not missing, f"{len(missing)} sampled branches not found by slug, e.g. {missing[0]}"
+    cases = [
+        ('search bank', lambda record: processor.search(record['BANK'], 'bank'), records),
+        ('search ifsc', lambda record: processor.search(record['IFSC'], 'ifsc'), records),
+        ('search micr', lambda record: processor.search(record['PHONE'] or '12345', 'micr'), records),
+        ('get_by_ifsc', lambda record: processor.get_by_ifsc(record['IFSC']), records),
+        ('get_by_bank_city_branch', lambda triple: processor.get_by_bank_city_branch(*triple), triples),
+        ('get_suggestions', lambda record: processor.get_suggestions(record['CITY2'][:4]), records),
+        ('get_all_banks', lambda _: processor.get_all_banks(), [None]),
+        ('get_cities_by_bank', lambda record: processor.get_cities_by_bank(record['BANK']), records),
+        ('get_branches_by_bank_city',
+         lambda record: processor.get_branches_by_bank_city(record['BANK'], record['CITY2']), records),
+        ('generate_sitemap', lambda _: processor.generate_sitemap(), [None]),
+    ]
+    return [(f'processor {name}', func, variants) for name, func, variants in cases]
+
+def start_razorpay_stub():
+    """Serve razorpay_stub on a free local port in a daemon thread; returns the server"""
+    from razorpay_stub import StubHandler
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(data_dir, rows, seed, only=None):
+    """Run every case whose name contains only; returns the results document"""
+    if not generate.is_generated(data_dir, rows, seed):
+        logging.info(f"Generating {rows} rows into {data_dir}")
+        generate.write_dataset(data_dir, rows, seed)
+    
+    # The app reads its settings from the environment and its files from
+    # the working directory when first imported
+    data_dir = os.path.abspath(data_dir)
+    snapshot_dir = os.path.join(data_dir, 'data_snapshot')
+    cache_path = os.path.join(data_dir, 'ifsc_cache.sqlite3')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(cache_path + suffix):
+            os.remove(cache_path + suffix)
+    os.chdir(data_dir)
+    sys.path.insert(0, REPO_DIR)
+    os.environ['BANK_DATA_SNAPSHOT'] = snapshot_dir
+    os.environ['IFSC_CACHE_PATH'] = cache_path
+    os.environ['DATA_WATCH_INTERVAL'] = '0'
+    stub = start_razorpay_stub()
+    os.environ['RAZORPAY_IFSC_URL'] = f'http://127.0.0.1:{stub.server_address[1]}'
+    
+    import numpy as np
+    import pandas as pd
+    import snapshot
+    from data_loader import CSV_FILES, BankDataLoader
+    from data_processor import BankDataProcessor
+    
+    results = {}
+    
+    def bench(name, func, variants, **limits):
+        if only and only not in name:
+            return
+        results[name] = measure(func, variants, **limits)
+        # The app logs at WARNING and above from here on, so progress goes straight to stderr
+        print(f"{name}: median {results[name]['median_ms']:.2f} ms over {results[name]['runs']} runs",
+              file=sys.stderr, flush=True)
+    
+    load_limits = {'budget': 0, 'min_runs': LOAD_RUNS}
+    bench('load csv', lambda _: BankDataLoader(snapshot_dir=None).load_data(), [None], **load_limits)
+    bench('load snapshot build', lambda _: snapshot.build(snapshot_dir), [None], **load_limits)
+    if not snapshot.is_fresh(snapshot_dir, CSV_FILES):
+        snapshot.build(snapshot_dir)
+    bench('load snapshot', lambda _: BankDataLoader(snapshot_dir=snapshot_dir).load_data(), [None], **load_limits)
+    bench('processor load_data', lambda _: BankDataProcessor(), [None], **load_limits)
+    
+    import app
+    logging.getLogger().setLevel(logging.WARNING)
+    data = app.init_data()
+    stub.RequestHandlerClass.loader = data
+    branches = sample_branches(data, seed)
+    
+    client = app.app.test_client()
+    for name, func, variants in route_cases(client, branches):
+        bench(name, func, variants)
+    
+    processor = BankDataProcessor()
+    for name, func, variants in processor_cases(processor, branches):
+        bench(name, func, variants)
+    
+    stub.shutdown()
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'rows': len(data.store),
+            'generated_rows': rows,
+            'seed': seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'results': results,
+    }
+
+def compare(baseline, current, threshold=THRESHOLD, noise_ms=NOISE_MS, only=None):
+    """Get (report lines, regressed case names) comparing the medians of current with baseline"""
+    lines = [f"{'case':<48} {'baseline':>10} {'current':>10} {'change':>8}"]
+    regressions = []
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            lines.append(f"{name:<48} {'-':>10} {stats['median_ms']:>10.2f} {'new':>8}")
+            continue
+        old, new = before['median_ms'], stats['median_ms']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if new - old > noise_ms and change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        lines.append(f"{name:<48} {old:>10.2f} {new:>10.2f} {change:>+8.0%}{flag}")
+    for name in baseline['results']:
+        if name not in current['results'] and (not only or only in name):
+            lines.append(f"{name:<48} {baseline['results'][name]['median_ms']:>10.2f} {'-':>10} {'missing':>8}")
+    return lines, regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app on a generated dataset")
+    parser.add_argument('--data', default=generate.OUTPUT_DIR, help="directory of the generated dataset")
+    parser.add_argument('--rows', type=int, default=generate.ROWS, help="rows of the generated dataset")
+    parser.add_argument('--seed', type=int, default=generate.SEED, help="seed of the dataset and of the sampled queries")
+    parser.add_argument('--only', help="run only the cases whose name contains this text")
+    parser.add_argument('--save', help="write the results to this JSON file, e.g. as a baseline")
+    parser.add_argument('--compare', help="compare the results with this baseline JSON file")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="relative slowdown of a median flagged as a regression")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    save = os.path.abspath(args.save) if args.save else None
+    
+    current = run(args.data, args.rows, args.seed, args.only)
+    
+    if save:
+        with open(save, 'w') as f:
+            json.dump(current, f, indent=2)
+            f.write('\n')
+        print(f"Saved {len(current['results'])} results to {save}", file=sys.stderr)
+    
+    if baseline is None:
+        for name, stats in current['results'].items():
+            print(f"{name:<48} median {stats['median_ms']:>10.2f} ms  p95 {stats['p95_ms']:>10.2f} ms  "
+                  f"first {stats['first_ms']:>10.2f} ms  runs {stats['runs']}")
+        return 0
+    
+    if baseline['meta'].get('rows') != current['meta']['rows']:
+        print(f"Warning: the baseline has {baseline['meta'].get('rows')} rows, this run {current['meta']['rows']}")
+    lines, regressions = compare(baseline, current, args.threshold, only=args.only)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"{len(regressions)} regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
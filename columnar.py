@@ -0,0 +1,293 @@
+import sys
+import numpy as np
+import pandas as pd
+from metrics import metrics
+
+def code_dtype(table_size):
+    """Get the smallest integer dtype able to index a table of this size"""
+    if table_size <= np.iinfo(np.int8).max:
+        return np.int8
+    if table_size <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+class DictColumn:
+    """String column stored as integer codes into one shared table of distinct values"""
+    
+    kind = 'dict'
+    
+    def __init__(self, codes, table):
+        self.codes = codes
+        self.table = table
+        self._lookup = None
+    
+    @classmethod
+    def from_values(cls, values):
+        codes, table = pd.factorize(pd.Series(values, dtype=object))
+        return cls(codes.astype(code_dtype(len(table))), [str(value) for value in table])
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a column from the arrays of to_arrays().
+        
+        The table stays packed in the given buffers, so a memory-mapped table
+        is decoded value by value on access rather than copied into the heap.
+        """
+        return cls(arrays['codes'], PackedStringColumn(arrays['table_buffer'], arrays['table_offsets']))
+    
+    def to_arrays(self):
+        table = self.table
+        if not isinstance(table, PackedStringColumn):
+            table = PackedStringColumn.from_values(table)
+        return {'codes': self.codes, 'table_buffer': table.buffer, 'table_offsets': table.offsets}
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def __getitem__(self, position):
+        return self.table[self.codes[position]]
+    
+    def __iter__(self):
+        table = self.table
+        return (table[code] for code in self.codes.tolist())
+    
+    def take(self, positions):
+        """Get the values at positions as a list, decoding each distinct value once"""
+        codes, inverse = np.unique(self.codes[positions], return_inverse=True)
+        table = self.table
+        values = [table[code] for code in codes.tolist()]
+        return [values[slot] for slot in inverse.tolist()]
+    
+    @property
+    def values(self):
+        """Distinct values, addressed by value id"""
+        return self.table
+    
+    def value_id(self, value):
+        """Get the id of a distinct value, or None if it never occurs"""
+        if self._lookup is None:
+            self._lookup = {text: value_id for value_id, text in enumerate(self.table)}
+        return self._lookup.get(value)
+    
+    def value_mask(self, value_ids, start=0, stop=None):
+        """Boolean row mask of rows in [start, stop) holding any of the given value ids"""
+        return np.isin(self.codes[start:stop], value_ids)
+    
+    def updated(self, keep, changed, changed_values, added_values):
+        """Get a patched copy: rows at positions changed take changed_values, rows
+        not in the keep mask are dropped and added_values are appended.
+        
+        Values no longer used leave the table, which is kept in order of
+        first appearance like a freshly encoded column. Returns (column,
+        id_remap, new_ids): the new id of every old value id (-1 if gone) and
+        the ids of the values new to the table.
+        """
+        table = list(self.table)
+        lookup = {value: value_id for value_id, value in enumerate(table)}
+        
+        def encode(values):
+            ids = []
+            for value in values:
+                value_id = lookup.get(value)
+                if value_id is None:
+                    value_id = lookup[value] = len(table)
+                    table.append(value)
+                ids.append(value_id)
+            return np.array(ids, dtype=np.int64)
+        
+        codes = self.codes.astype(np.int64)
+        codes[changed] = encode(changed_values)
+        codes = np.concatenate([codes[keep], encode(added_values)])
+        
+        used, first = np.unique(codes, return_index=True)
+        order = used[np.argsort(first)]
+        remap = np.full(len(table), -1, dtype=np.int64)
+        remap[order] = np.arange(len(order))
+        column = DictColumn(remap[codes].astype(code_dtype(len(order))), [table[value_id] for value_id in order.tolist()])
+        old_size = len(self.table)
+        new_ids = remap[old_size:]
+        return column, remap[:old_size], np.sort(new_ids[new_ids >= 0])
+    
+    def nbytes(self):
+        if isinstance(self.table, PackedStringColumn):
+            return self.codes.nbytes + self.table.nbytes()
+        return (self.codes.nbytes + sys.getsizeof(self.table) +
+                sum(sys.getsizeof(value) for value in self.table))
+
+class PackedStringColumn:
+    """String column stored back to back in one UTF-8 buffer, sliced by row offsets.
+    
+    Every row is its own value, so value ids are row positions.
+    """
+    
+    kind = 'packed'
+    
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+    
+    @classmethod
+    def from_values(cls, values):
+        encoded = [str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(buffer, offsets)
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a column from the arrays of to_arrays()"""
+        return cls(arrays['buffer'], arrays['offsets'])
+    
+    def to_arrays(self):
+        return {'buffer': self.buffer, 'offsets': self.offsets}
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, position):
+        return str(self.buffer[self.offsets[position]:self.offsets[position + 1]], 'utf-8')
+    
+    def __iter__(self):
+        data = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        return (data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:]))
+    
+    def take(self, positions):
+        """Get the values at positions as a list"""
+        positions = np.asarray(positions, dtype=np.int64)
+        buffer = self.buffer
+        starts = self.offsets[positions].tolist()
+        ends = self.offsets[positions + 1].tolist()
+        return [str(buffer[start:end], 'utf-8') for start, end in zip(starts, ends)]
+    
+    @property
+    def values(self):
+        """Distinct values, addressed by value id"""
+        return self
+    
+    def starts_with(self, positions, prefix, whole=False):
+        """Boolean mask of the values at positions starting with an ASCII prefix,
+        ignoring ASCII case; with whole, only values equal to it.
+        
+        The bytes are compared in place, without decoding any value.
+        """
+        prefix = np.frombuffer(prefix.lower().encode('ascii'), dtype=np.uint8)
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        mask = lengths == len(prefix) if whole else lengths >= len(prefix)
+        window = self.buffer[starts[mask][:, None] + np.arange(len(prefix))]
+        window = np.where((window >= ord('A')) & (window <= ord('Z')), window + 32, window)
+        mask[mask] = (window == prefix).all(axis=1)
+        return mask
+    
+    def value_mask(self, value_ids, start=0, stop=None):
+        """Boolean row mask of rows in [start, stop) holding any of the given value ids"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        mask = np.zeros(max(stop - start, 0), dtype=bool)
+        value_ids = np.asarray(value_ids)
+        mask[value_ids[(value_ids >= start) & (value_ids < stop)] - start] = True
+        return mask
+    
+    def updated(self, keep, changed, changed_values, added_values):
+        """Get a patched copy: rows at positions changed take changed_values, rows
+        not in the keep mask are dropped and added_values are appended.
+        
+        The bytes of untouched rows are copied over in one step. Returns
+        (column, id_remap, new_ids) like DictColumn.updated(); since value ids
+        are positions, changed rows count as gone and new.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        changed = np.asarray(changed, dtype=np.int64)
+        remap = np.where(keep, np.cumsum(keep) - 1, -1)
+        kept = int(np.count_nonzero(keep))
+        patched = np.concatenate([remap[changed], np.arange(kept, kept + len(added_values))])
+        encoded = [str(value).encode('utf-8') for value in list(changed_values) + list(added_values)]
+        
+        old_lengths = np.diff(self.offsets)
+        lengths = np.zeros(kept + len(added_values), dtype=np.int64)
+        lengths[:kept] = old_lengths[keep]
+        lengths[patched] = [len(value) for value in encoded]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        
+        copied = keep.copy()
+        copied[changed] = False
+        copied_to = np.zeros(len(lengths), dtype=bool)
+        copied_to[remap[copied]] = True
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        buffer[np.repeat(copied_to, lengths)] = self.buffer[np.repeat(copied, old_lengths)]
+        for position, value in zip(patched.tolist(), encoded):
+            buffer[offsets[position]:offsets[position + 1]] = np.frombuffer(value, dtype=np.uint8)
+        
+        remap[changed] = -1
+        return PackedStringColumn(buffer, offsets), remap, np.sort(patched)
+    
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+class ColumnStore:
+    """Row table held as one encoded column per field.
+    
+    Low-cardinality fields are dictionary encoded; everything else is packed
+    into a contiguous buffer. Rows are materialized as dicts only on demand.
+    """
+    
+    column_types = {column_type.kind: column_type for column_type in (DictColumn, PackedStringColumn)}
+    
+    def __init__(self, columns):
+        self.columns = columns
+    
+    @classmethod
+    def from_dataframe(cls, df, dict_columns):
+        columns = {}
+        for col in df.columns:
+            if col in dict_columns:
+                columns[col] = DictColumn.from_values(df[col])
+            else:
+                columns[col] = PackedStringColumn.from_values(df[col])
+        return cls(columns)
+    
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+    
+    def __contains__(self, name):
+        return name in self.columns
+    
+    def __getitem__(self, name):
+        return self.columns[name]
+    
+    @metrics.timed('to_dict')
+    def row(self, position):
+        """Get one row as a dict of column name to value"""
+        return {name: column[position] for name, column in self.columns.items()}
+    
+    @metrics.timed('to_dict')
+    def rows(self, positions, names=None):
+        """Get rows as dicts, in the order of positions, optionally of only some columns.
+        
+        Values are decoded column by column, which is much cheaper than row by
+        row for more than a handful of rows.
+        """
+        names = list(self.columns) if names is None else names
+        values = [self.columns[name].take(positions) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+    
+    def updated(self, keep, changed, changed_rows, added_rows):
+        """Get a patched copy of the store, see DictColumn.updated().
+        
+        changed_rows and added_rows are dicts of column name to values.
+        Returns (store, remaps), remaps holding (id_remap, new_ids) per column.
+        """
+        columns = {}
+        remaps = {}
+        for name, column in self.columns.items():
+            columns[name], id_remap, new_ids = column.updated(keep, changed, changed_rows[name], added_rows[name])
+            remaps[name] = (id_remap, new_ids)
+        return ColumnStore(columns), remaps
+    
+    def nbytes(self):
+        return sum(column.nbytes() for column in self.columns.values())
@@ -1,37 +1,177 @@
 import pandas as pd
+import numpy as np
+import bisect
+import heapq
 import logging
 import os
+import re
+import threading
+import time
+import sitemap
+import snapshot
+from collections import OrderedDict
+from columnar import ColumnStore, PackedStringColumn
+from facets import FacetIndex
+from metrics import metrics
+from search_index import WORD_RE, FuzzyIndex, GroupIndex, HashIndex, PrefixIndex, TrigramIndex, code_keys
+
+CSV_FILES = ['bank_data_1.csv', 'bank_data_2.csv']
+
+# Directory of the prebuilt binary snapshot (see snapshot.py)
+SNAPSHOT_DIR = os.environ.get('BANK_DATA_SNAPSHOT', 'data_snapshot')
+
+DATA_COLUMNS = ['BANK', 'IFSC', 'BRANCH', 'ADDRESS', 'CITY1', 'CITY2', 'STATE', 'STD CODE', 'PHONE']
+
+# Columns covered by the general free-text search
+SEARCH_COLUMNS = ['BANK', 'BRANCH', 'CITY1', 'CITY2', 'STATE', 'ADDRESS']
+
+# Columns with a substring index
+TEXT_INDEX_COLUMNS = SEARCH_COLUMNS + ['IFSC', 'PHONE']
+
+# Rows scanned per step when paging through search results
+SCAN_CHUNK = 32768
+
+# Low-cardinality columns stored as codes into a shared string table;
+# the rest (IFSC, ADDRESS, PHONE) are packed into contiguous buffers
+DICT_COLUMNS = ['BANK', 'BRANCH', 'CITY1', 'CITY2', 'STATE', 'STD CODE']
+
+# Columns whose slugs make up a /bank/<bank>/<city>/<branch> URL
+SLUG_COLUMNS = ['BANK', 'CITY1', 'BRANCH']
+
+# Columns of the (bank, city) groups related branches are listed from
+RELATED_COLUMNS = ['BANK', 'CITY1']
+
+# Columns fuzzy search matches query words against, and whose words it
+# knows the spellings of
+FUZZY_COLUMNS = ['BANK', 'BRANCH', 'CITY1', 'CITY2', 'STATE']
+
+# Closest respellings of each query word tried by fuzzy search
+FUZZY_SPELLINGS = 10
+
+# Relevance of a general search match: the kind of match counts first, a
+# whole value over a value's prefix over any substring, then the column
+MATCH_SCORES = {'exact': 300, 'prefix': 200, 'substring': 100}
+RELEVANCE_WEIGHTS = {'IFSC': 50, 'BANK': 40, 'BRANCH': 40, 'CITY1': 30, 'CITY2': 20, 'STATE': 20, 'ADDRESS': 0}
+
+# Row positions kept across the cached rankings of paged general and fuzzy searches
+RANKING_CACHE_POSITIONS = int(os.environ.get('RANKING_CACHE_POSITIONS', 4000000))
+
+# Autocomplete kinds and the columns whose distinct values they complete
+SUGGEST_SOURCES = {
+    'ifsc': ['IFSC'],
+    'bank': ['BANK'],
+    'city': ['CITY1', 'CITY2'],
+    'branch': ['BRANCH'],
+}
+
+# Levels of the bank details form, outermost first, and the columns holding their values
+FACET_LEVELS = {
+    'bank': ['BANK'],
+    'state': ['STATE'],
+    'city': ['CITY1', 'CITY2'],
+    'branch': ['BRANCH'],
+}
+
+# Column of a delta file saying what happens to each IFSC code: rows marked
+# CLOSE_ACTION remove the code, any other row adds or replaces it
+DELTA_ACTION = 'ACTION'
+CLOSE_ACTION = 'close'
+
+def slugify(text):
+    """Convert text to URL-friendly slug"""
+    text = str(text).lower()
+    text = re.sub(r'[^\w\s-]', '', text)
+    text = re.sub(r'[-\s]+', '-', text)
+    return text.strip('-')
+
+def fuzzy_edits(word):
+    """Get the edits fuzzy search allows in a query word, more for longer words"""
+    if len(word) < 3:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+def top_positions(scores, count=None):
+    """Get the positions of the count highest positive scores, best first and
+    ties in file order; all of them if count is None.
+    
+    The top count are selected in linear time and only they are sorted.
+    """
+    positions = np.flatnonzero(scores > 0)
+    if count is not None and count <= 0:
+        return positions[:0]
+    # One key per row orders by score, then by position
+    keys = scores[positions].astype(np.int64) * len(scores) - positions
+    if count is not None and count < len(positions):
+        top = np.argpartition(-keys, count - 1)[:count]
+        positions, keys = positions[top], keys[top]
+    return positions[np.argsort(-keys)]
 
 class BankDataLoader:
-    def __init__(self):
-        self.data = None
+    def __init__(self, csv_files=CSV_FILES, snapshot_dir=SNAPSHOT_DIR):
+        self.csv_files = csv_files
+        self.snapshot_dir = snapshot_dir
+        self.store = None
+        self.version = None
+        self.memory_report = {}
+        self.sitemap_dir = None
+        self.ifsc_index = None
+        self.ifsc_keys = None
+        self.slug_tables = {}
+        self.slug_index = None
+        self.slug_collisions = None
+        self.related_index = None
+        self.text_index = {}
+        self.suggest_index = {}
+        self.facet_index = None
+        self.fuzzy_index = None
+        self._distinct = {}
+        self._rankings = OrderedDict()
+        self._rankings_lock = threading.Lock()
     
     def load_data(self):
-        """Load and combine bank data from CSV files"""
+        """Load bank data from the snapshot if it is up to date, otherwise from the CSV files"""
+        if self.snapshot_dir and snapshot.is_fresh(self.snapshot_dir, self.csv_files):
+            try:
+                return self.load_snapshot()
+            except Exception as e:
+                logging.error(f"Error loading snapshot {self.snapshot_dir}, falling back to CSV: {e}")
+        
         try:
             # Load both CSV files
-            df1 = pd.read_csv('bank_data_1.csv')
-            df2 = pd.read_csv('bank_data_2.csv')
+            dataframes = [pd.read_csv(csv_file, dtype=str) for csv_file in self.csv_files]
             
             # Combine dataframes
-            combined_df = pd.concat([df1, df2], ignore_index=True)
+            combined_df = pd.concat(dataframes, ignore_index=True)
             
             # Clean and standardize data
             combined_df = self._clean_data(combined_df)
-            
-            logging.info(f"Loaded {len(combined_df)} bank records")
-            self.data = combined_df
-            return combined_df
-            
+            version = snapshot.dataset_version(self.csv_files)
+        
         except Exception as e:
             logging.error(f"Error loading bank data: {e}")
-            # Return empty dataframe if files not found
-            return pd.DataFrame(columns=['BANK', 'IFSC', 'BRANCH', 'ADDRESS', 'CITY1', 'CITY2', 'STATE', 'STD CODE', 'PHONE'])
+            # Use an empty dataset if files not found
+            combined_df = pd.DataFrame(columns=DATA_COLUMNS, dtype=str)
+            version = 'empty'
+        
+        self._build(combined_df)
+        self.version = version
+        logging.info(f"Loaded {len(self.store)} bank records")
+        return self.store
+    
+    def load_snapshot(self):
+        """Load the column store and indexes from the binary snapshot"""
+        manifest, store, index_arrays = snapshot.read_snapshot(self.snapshot_dir)
+        self._index_store(store, index_arrays)
+        self.version = manifest['dataset_version']
+        if manifest.get('sitemap_base_url') == sitemap.SITEMAP_BASE_URL:
+            self.sitemap_dir = os.path.abspath(os.path.join(self.snapshot_dir, snapshot.SITEMAPS))
+        logging.info(f"Loaded {len(self.store)} bank records from snapshot {self.version}")
+        return self.store
     
     def _clean_data(self, df):
         """Clean and standardize the bank data"""
         # Remove duplicates based on IFSC
-        df = df.drop_duplicates(subset=['IFSC'], keep='first')
+        df = df.drop_duplicates(subset=['IFSC'], keep='first').reset_index(drop=True)
         
         # Clean text fields
         text_columns = ['BANK', 'BRANCH', 'ADDRESS', 'CITY1', 'CITY2', 'STATE']
@@ -48,49 +188,828 @@ class BankDataLoader:
         
         return df
     
+    def read_delta(self, path):
+        """Read and clean a delta CSV file of data columns plus an optional DELTA_ACTION column.
+        
+        Rows closing a code need only IFSC. A code listed more than once
+        takes its last row.
+        """
+        df = pd.read_csv(path, dtype=str)
+        if 'IFSC' not in df.columns:
+            raise ValueError(f"{path} has no IFSC column")
+        columns = list(self.store.columns) if self.store is not None else DATA_COLUMNS
+        for col in columns + [DELTA_ACTION]:
+            if col not in df.columns:
+                df[col] = ''
+        df['IFSC'] = df['IFSC'].fillna('').str.strip().str.upper()
+        df[DELTA_ACTION] = df[DELTA_ACTION].fillna('').str.strip().str.lower()
+        df = df[df['IFSC'] != ''].drop_duplicates(subset=['IFSC'], keep='last')
+        return self._clean_data(df[columns + [DELTA_ACTION]])
+    
+    def _build(self, df):
+        """Encode the cleaned dataframe into the column store and index it"""
+        store = ColumnStore.from_dataframe(df, DICT_COLUMNS)
+        self.memory_report = {
+            'dataframe_bytes': int(df.memory_usage(deep=True).sum()),
+            'store_bytes': store.nbytes(),
+        }
+        logging.info(f"Column store uses {self.memory_report['store_bytes'] / 2**20:.1f} MB, "
+                     f"down from {self.memory_report['dataframe_bytes'] / 2**20:.1f} MB as a DataFrame")
+        
+        self._index_store(store)
+    
+    def _index_store(self, store, arrays=None):
+        """Build lookup indexes over row positions.
+        
+        arrays maps index names to prebuilt index arrays, as returned by
+        index_arrays(); indexes found there are reused instead of rebuilt.
+        """
+        arrays = arrays or {}
+        self.store = store
+        self._distinct = {}
+        self._rankings = OrderedDict()
+        self._build_ifsc_index(store, arrays)
+        self._build_slug_index(store, arrays)
+        self._build_related_index(store, arrays)
+        self._build_text_index(store, arrays)
+        self._build_suggest_index(store, arrays)
+        self._build_facet_index(store, arrays)
+        self._build_fuzzy_index(store, arrays)
+    
+    def index_arrays(self):
+        """Get the arrays of every index by name, for writing a snapshot"""
+        arrays = {
+            'ifsc': self.ifsc_index.to_arrays(),
+            'ifsc_keys': self.ifsc_keys.to_arrays(),
+            'slug': self.slug_index.to_arrays(),
+            'slug_collisions': self.slug_collisions.to_arrays(),
+            'related': self.related_index.to_arrays(),
+        }
+        for col, table in self.slug_tables.items():
+            arrays[f"slug_table.{col}"] = table.to_arrays()
+        for col, index in self.text_index.items():
+            arrays[f"text.{col}"] = index.to_arrays()
+        for kind, index in self.suggest_index.items():
+            arrays[f"suggest.{kind}"] = index.to_arrays()
+        for level, level_arrays in zip(FACET_LEVELS, self.facet_index.to_arrays()):
+            arrays[f"facet.{level}"] = level_arrays
+        arrays['fuzzy'] = self.fuzzy_index.to_arrays()
+        return arrays
+    
+    def _build_ifsc_index(self, store, arrays):
+        """Hash each IFSC code to the position of its first row, and sort the packed codes for batch joins"""
+        column = store['IFSC']
+        if 'ifsc' in arrays:
+            self.ifsc_index = HashIndex.from_arrays(arrays['ifsc'], column.__getitem__)
+        else:
+            self.ifsc_index, _ = HashIndex.build(list(column), column.__getitem__)
+        
+        if 'ifsc_keys' in arrays:
+            self.ifsc_keys = GroupIndex.from_arrays(arrays['ifsc_keys'])
+        else:
+            # Codes that do not pack into a key are left to the hash index
+            keys = code_keys(list(column))
+            positions = np.flatnonzero(keys >= 0)
+            self.ifsc_keys = GroupIndex.build(keys[positions], positions)
+    
+    def _slug_key(self, position):
+        """Get the bank/city/branch slug key of a row"""
+        return '/'.join(self.slug_tables[col][self.store[col].codes[position]] for col in SLUG_COLUMNS)
+    
+    def _build_slug_index(self, store, arrays):
+        """Hash bank/city/branch slug keys to row positions.
+        
+        Each slug column keeps a table with the slug of every distinct value,
+        so a row's key is rebuilt from its codes without slugifying again. The
+        first row in file order owns the URL. Keys shared by more than one row
+        are kept in a separate collisions index, from the owning position to
+        all positions.
+        """
+        for col in SLUG_COLUMNS:
+            name = f"slug_table.{col}"
+            if name in arrays:
+                self.slug_tables[col] = PackedStringColumn.from_arrays(arrays[name])
+            else:
+                self.slug_tables[col] = PackedStringColumn.from_values(
+                    slugify(value) for value in store[col].table)
+        
+        if 'slug' in arrays:
+            self.slug_index = HashIndex.from_arrays(arrays['slug'], self._slug_key)
+            self.slug_collisions = GroupIndex.from_arrays(arrays['slug_collisions'])
+            return
+        
+        slugs = [list(self.slug_tables[col]) for col in SLUG_COLUMNS]
+        columns = [[table[code] for code in store[col].codes.tolist()]
+                   for col, table in zip(SLUG_COLUMNS, slugs)]
+        keys = ['/'.join(parts) for parts in zip(*columns)]
+        self.slug_index, repeats = HashIndex.build(keys, self._slug_key)
+        
+        groups = {}
+        for first, position in repeats:
+            groups.setdefault(first, [first]).append(position)
+        self.slug_collisions = GroupIndex.build(
+            [first for first, positions in groups.items() for _ in positions],
+            [position for positions in groups.values() for position in positions])
+        
+        if groups:
+            logging.warning(f"{len(groups)} bank/city/branch slugs are shared by more than one IFSC")
+    
+    def _related_key(self, bank_ids, city_ids):
+        """Get the related index key of (BANK, CITY1) value id pairs"""
+        bank, city = (self.store[col] for col in RELATED_COLUMNS)
+        return np.asarray(bank_ids, dtype=np.int64) * len(city.values) + city_ids
+    
+    def _build_related_index(self, store, arrays):
+        """Group row positions by (BANK, CITY1) value ids, in file order within each group"""
+        if 'related' in arrays:
+            self.related_index = GroupIndex.from_arrays(arrays['related'])
+        else:
+            bank, city = (store[col] for col in RELATED_COLUMNS)
+            self.related_index = GroupIndex.build(self._related_key(bank.codes, city.codes),
+                                                  np.arange(len(store)))
+    
+    def _build_text_index(self, store, arrays):
+        """Build a trigram index over the distinct values of each searchable column"""
+        self.text_index = {}
+        for col in TEXT_INDEX_COLUMNS:
+            if col in store:
+                name = f"text.{col}"
+                if name in arrays:
+                    self.text_index[col] = TrigramIndex.from_arrays(store[col].values, arrays[name])
+                else:
+                    self.text_index[col] = TrigramIndex(store[col].values)
+    
+    def _distinct_values(self, store, columns):
+        """Get the distinct values of one or more columns, computed once per store"""
+        key = tuple(columns)
+        if key not in self._distinct:
+            if len(columns) == 1:
+                self._distinct[key] = store[columns[0]].values
+            else:
+                values = set()
+                for col in columns:
+                    values.update(store[col].values)
+                self._distinct[key] = sorted(values)
+        return self._distinct[key]
+    
+    def _build_suggest_index(self, store, arrays):
+        """Build autocomplete indexes over the distinct IFSC, bank, city and branch values"""
+        self.suggest_index = {}
+        for kind, columns in SUGGEST_SOURCES.items():
+            values = self._distinct_values(store, columns)
+            name = f"suggest.{kind}"
+            if name in arrays:
+                self.suggest_index[kind] = PrefixIndex.from_arrays(values, arrays[name])
+            else:
+                self.suggest_index[kind] = PrefixIndex(values)
+    
+    def _build_facet_index(self, store, arrays):
+        """Build the bank -> state -> city -> branch facet index for the bank details form"""
+        vocabs = [self._distinct_values(store, columns) for columns in FACET_LEVELS.values()]
+        names = [f"facet.{level}" for level in FACET_LEVELS]
+        if all(name in arrays for name in names):
+            self.facet_index = FacetIndex.from_arrays(vocabs, [arrays[name] for name in names])
+            return
+        
+        self.facet_index = FacetIndex.build(vocabs, self._facet_row_ids(store, vocabs))
+    
+    def _build_fuzzy_index(self, store, arrays):
+        """Index the distinct words of the fuzzy search columns for finding respellings"""
+        if 'fuzzy' in arrays:
+            self.fuzzy_index = FuzzyIndex.from_arrays(arrays['fuzzy'])
+        else:
+            self.fuzzy_index = FuzzyIndex.from_values(self._distinct_values(store, FUZZY_COLUMNS))
+    
+    @staticmethod
+    def _facet_row_ids(store, vocabs):
+        """Get, for each facet level, one array of row value ids per source column"""
+        row_ids = []
+        for columns, vocab in zip(FACET_LEVELS.values(), vocabs):
+            if len(columns) == 1:
+                row_ids.append([store[columns[0]].codes])
+                continue
+            # Map each column's codes onto ids in the shared vocabulary
+            lookup = {value: value_id for value_id, value in enumerate(vocab)}
+            row_ids.append([np.array([lookup[value] for value in store[col].table], dtype=np.int32)[store[col].codes]
+                            for col in columns])
+        return row_ids
+    
+    def apply_delta(self, delta):
+        """Get a new loader with a delta of closed, changed and added IFSC rows applied.
+        
+        delta is a DataFrame as returned by read_delta(). Closed rows are
+        dropped, changed rows keep their position and added rows are
+        appended, as if the source files had been edited in place. The store
+        is patched rather than re-encoded, and every index is updated from
+        the touched rows only; this loader is left as it is. Returns the new
+        loader and counts of closed, changed, added and unknown codes.
+        """
+        started = time.time()
+        positions = self.resolve_ifsc_codes(delta['IFSC'].tolist())
+        closing = (delta[DELTA_ACTION] == CLOSE_ACTION).to_numpy()
+        found = positions >= 0
+        closed = np.sort(positions[closing & found])
+        order = np.argsort(positions[~closing & found])
+        changed = positions[~closing & found][order]
+        changed_rows = delta[~closing & found].iloc[order]
+        added_rows = delta[~closing & ~found]
+        counts = {'closed': len(closed), 'changed': len(changed), 'added': len(added_rows),
+                  'unknown': int(np.count_nonzero(closing & ~found))}
+        
+        keep = np.ones(len(self.store), dtype=bool)
+        keep[closed] = False
+        row_remap = np.where(keep, np.cumsum(keep) - 1, -1)
+        store, remaps = self.store.updated(
+            keep, changed,
+            {col: changed_rows[col].tolist() for col in self.store.columns},
+            {col: added_rows[col].tolist() for col in self.store.columns})
+        kept = int(np.count_nonzero(keep))
+        added = np.arange(kept, kept + len(added_rows))
+        # Rows gone or replaced, as old positions, and rows new or replaced, as new positions
+        touched_old = np.concatenate([closed, changed])
+        touched_new = np.concatenate([row_remap[changed], added])
+        
+        loader = BankDataLoader(self.csv_files, self.snapshot_dir)
+        loader.store = store
+        loader.memory_report = {'store_bytes': store.nbytes()}
+        
+        # IFSC codes only come and go: changed rows keep theirs
+        ifsc = store['IFSC']
+        changes = {self.store['IFSC'][position]: None for position in closed.tolist()}
+        changes.update({ifsc[position]: position for position in added.tolist()})
+        loader.ifsc_index = self.ifsc_index.updated(row_remap, changes, ifsc.__getitem__)
+        keys = code_keys(ifsc.take(added))
+        loader.ifsc_keys = self.ifsc_keys.updated(row_remap, keys[keys >= 0], added[keys >= 0])
+        
+        loader._update_slug_index(self, row_remap, remaps, touched_old, touched_new)
+        loader._update_related_index(self, row_remap, remaps, touched_old, touched_new)
+        for col, index in self.text_index.items():
+            loader.text_index[col] = index.updated(store[col].values, *remaps[col])
+        for kind, index in self.suggest_index.items():
+            columns = SUGGEST_SOURCES[kind]
+            loader.suggest_index[kind] = index.updated(loader._distinct_values(store, columns),
+                                                       *loader._vocab_remap(self, columns, remaps))
+        
+        vocabs = [loader._distinct_values(store, columns) for columns in FACET_LEVELS.values()]
+        vocab_remaps = [loader._vocab_remap(self, columns, remaps)[0] for columns in FACET_LEVELS.values()]
+        old_row_ids = self._facet_row_ids(self.store, self.facet_index.vocabs)
+        row_ids = self._facet_row_ids(store, vocabs)
+        affected = []
+        for level, vocab_remap in enumerate(vocab_remaps):
+            old_ids = vocab_remap[np.concatenate([ids[touched_old] for ids in old_row_ids[level]])]
+            new_ids = np.concatenate([ids[touched_new] for ids in row_ids[level]])
+            affected.append(np.union1d(old_ids[old_ids >= 0], new_ids))
+        loader.facet_index = self.facet_index.updated(vocabs, vocab_remaps, row_ids, affected)
+        loader._update_fuzzy_index(self, remaps)
+        
+        logging.info(f"Applied delta of {counts['closed']} closed, {counts['changed']} changed and "
+                     f"{counts['added']} added codes in {time.time() - started:.1f}s")
+        return loader, counts
+    
+    def _vocab_remap(self, old, columns, remaps):
+        """Get (id_remap, new_ids) from old's distinct values of columns to this loader's"""
+        if len(columns) == 1:
+            return remaps[columns[0]]
+        old_values = old._distinct_values(old.store, columns)
+        values = self._distinct_values(self.store, columns)
+        lookup = {value: value_id for value_id, value in enumerate(values)}
+        id_remap = np.array([lookup.get(value, -1) for value in old_values], dtype=np.int64)
+        old_values = set(old_values)
+        return id_remap, np.array([value_id for value_id, value in enumerate(values) if value not in old_values],
+                                  dtype=np.int64)
+    
+    def _update_slug_index(self, old, row_remap, remaps, touched_old, touched_new):
+        """Update old's slug tables and indexes for this loader's patched store.
+        
+        Only keys held by a touched row, before or after the delta, can change
+        owner or collisions; their groups are recomputed from old's groups and
+        the touched rows, and every other entry is remapped.
+        """
+        for col in SLUG_COLUMNS:
+            id_remap, new_ids = remaps[col]
+            old_slugs = list(old.slug_tables[col])
+            table = self.store[col].table
+            slugs = [None] * len(table)
+            for old_id, value_id in enumerate(id_remap.tolist()):
+                if value_id >= 0:
+                    slugs[value_id] = old_slugs[old_id]
+            for value_id in new_ids.tolist():
+                slugs[value_id] = slugify(table[value_id])
+            self.slug_tables[col] = PackedStringColumn.from_values(slugs)
+        
+        touched = {}
+        for position in touched_new.tolist():
+            touched.setdefault(self._slug_key(position), []).append(position)
+        affected = {old._slug_key(position) for position in touched_old.tolist()}
+        affected.update(touched)
+        
+        replaced = set(touched_new.tolist())
+        changes = {}
+        groups = {}
+        for key in affected:
+            positions = []
+            owner = old.slug_index.get(key)
+            if owner is not None:
+                group = old.slug_collisions.get(owner)
+                positions = [position for position in row_remap[group if len(group) else [owner]].tolist()
+                             if position >= 0 and position not in replaced]
+            positions = sorted(positions + touched.get(key, []))
+            changes[key] = positions[0] if positions else None
+            if len(positions) > 1:
+                groups[positions[0]] = positions
+        self.slug_index = old.slug_index.updated(row_remap, changes, self._slug_key)
+        
+        collisions = old.slug_collisions
+        untouched = np.array([old._slug_key(owner) not in affected for owner in collisions.keys.tolist()], dtype=bool)
+        entries = np.repeat(untouched, np.diff(collisions.offsets))
+        owners = np.array([owner for owner, positions in groups.items() for _ in positions], dtype=np.int64)
+        members = np.array([position for positions in groups.values() for position in positions], dtype=np.int64)
+        self.slug_collisions = GroupIndex.build(
+            np.concatenate([row_remap[np.repeat(collisions.keys, np.diff(collisions.offsets))[entries]], owners]),
+            np.concatenate([row_remap[collisions.positions[entries]], members]))
+    
+    def _update_related_index(self, old, row_remap, remaps, touched_old, touched_new):
+        """Update old's related index for this loader's patched store.
+        
+        Groups are re-keyed by the new ids of their bank and city, touched
+        rows leave their old groups and join their new ones.
+        """
+        bank_remap, city_remap = (remaps[col][0] for col in RELATED_COLUMNS)
+        old_cities = len(old.store[RELATED_COLUMNS[1]].values)
+        group_banks = bank_remap[old.related_index.keys // old_cities]
+        group_cities = city_remap[old.related_index.keys % old_cities]
+        key_remap = np.where((group_banks >= 0) & (group_cities >= 0), self._related_key(group_banks, group_cities), -1)
+        
+        remap = row_remap.copy()
+        remap[touched_old] = -1
+        bank, city = (self.store[col] for col in RELATED_COLUMNS)
+        keys = self._related_key(bank.codes[touched_new], city.codes[touched_new])
+        self.related_index = old.related_index.updated(remap, keys, touched_new, key_remap)
+    
+    def _update_fuzzy_index(self, old, remaps):
+        """Update old's fuzzy index for this loader's patched store.
+        
+        Only words of values gone from or new to FUZZY_COLUMNS can leave or
+        join the vocabulary. A word of a gone value stays if some value still
+        holds it, which the updated trigram indexes find without a scan.
+        """
+        gone_words = set()
+        new_words = set()
+        for col in FUZZY_COLUMNS:
+            id_remap, new_ids = remaps[col]
+            old_values = old.store[col].values
+            for value_id in np.flatnonzero(id_remap < 0).tolist():
+                gone_words.update(WORD_RE.findall(old_values[value_id].casefold()))
+            values = self.store[col].values
+            for value_id in new_ids.tolist():
+                new_words.update(WORD_RE.findall(values[value_id].casefold()))
+        
+        def still_held(word):
+            for col in FUZZY_COLUMNS:
+                values = self.store[col].values
+                for value_id in self.text_index[col].search(word).tolist():
+                    if word in WORD_RE.findall(values[value_id].casefold()):
+                        return True
+            return False
+        gone_words = {word for word in gone_words - new_words if not still_held(word)}
+        
+        old_words = list(old.fuzzy_index.words)
+        added = sorted(new_words.difference(old_words))
+        words = list(heapq.merge((word for word in old_words if word not in gone_words), added))
+        lookup = {word: word_id for word_id, word in enumerate(words)}
+        word_remap = np.array([lookup.get(word, -1) for word in old_words], dtype=np.int64)
+        new_ids = np.array([lookup[word] for word in added], dtype=np.int64)
+        self.fuzzy_index = old.fuzzy_index.updated(words, word_remap, new_ids)
+    
+    @metrics.timed('filter')
+    def suggest(self, kind, query, limit):
+        """Get up to limit autocomplete values of one kind (ifsc, bank, city or branch)"""
+        index = self.suggest_index.get(kind)
+        if index is None:
+            return []
+        # IFSC codes only complete from the start, like the code itself
+        if kind == 'ifsc':
+            return index.complete(query, limit)
+        columns = SUGGEST_SOURCES[kind]
+        return index.complete(query, limit, substring=lambda query: self._matching_value_ids(columns, query))
+    
+    def _matching_value_ids(self, columns, query):
+        """Get the sorted ids of the distinct values of columns containing query, from the trigram indexes"""
+        if len(columns) == 1:
+            return self.text_index[columns[0]].search(query)
+        # Values of several columns are merged into one sorted list, so map them by bisecting it
+        values = self._distinct_values(self.store, columns)
+        found = set()
+        for col in columns:
+            table = self.store[col].values
+            found.update(table[value_id] for value_id in self.text_index[col].search(query).tolist())
+        return np.array(sorted(bisect.bisect_left(values, value) for value in found), dtype=np.int32)
+    
+    def contains_mask(self, column, query):
+        """Boolean row mask for a case-insensitive substring match on one column"""
+        return self.plan_mask([self.plan_clause([column], query)])
+    
+    def plan_clause(self, columns, query):
+        """Plan a case-insensitive substring match of query in any of columns.
+        
+        A clause is a list of (column, query, value ids) entries; a row
+        satisfies it if one of its columns holds one of the value ids. A
+        search plan is a list of clauses a row must all satisfy. Packed
+        columns have one value per row, so their value ids are left as None
+        and looked up per scanned range of rows instead.
+        """
+        clause = []
+        for col in columns:
+            if col in self.text_index:
+                value_ids = None if self.store[col].kind == 'packed' else self.text_index[col].search(query)
+                clause.append((col, query, value_ids))
+        return clause
+    
+    def plan_bank_details(self, bank, city='', state='', branch=''):
+        """Plan a search by bank name, optionally narrowed by city, state and branch"""
+        plan = [self.plan_clause(['BANK'], bank)]
+        if city:
+            plan.append(self.plan_clause(['CITY1', 'CITY2'], city))
+        if state:
+            plan.append(self.plan_clause(['STATE'], state))
+        if branch:
+            plan.append(self.plan_clause(['BRANCH'], branch))
+        return plan
+    
+    def plan_mask(self, plan, start=0, stop=None):
+        """Boolean mask over rows [start, stop) of the rows satisfying a plan"""
+        stop = len(self.store) if stop is None else min(stop, len(self.store))
+        mask = np.ones(max(stop - start, 0), dtype=bool)
+        for clause in plan:
+            matches = np.zeros_like(mask)
+            for col, query, value_ids in clause:
+                if value_ids is None:
+                    value_ids = self.text_index[col].search(query, start, stop)
+                matches |= self.store[col].value_mask(value_ids, start, stop)
+            mask &= matches
+        return mask
+    
+    @metrics.timed('filter')
+    def count_matches(self, plan):
+        """Count the rows satisfying a plan"""
+        return int(np.count_nonzero(self.plan_mask(plan)))
+    
+    @metrics.timed('filter')
+    def search_page(self, plan, limit, start=0):
+        """Get up to limit records satisfying a plan, scanning from row position start.
+        
+        Rows are scanned in chunks of SCAN_CHUNK and the scan stops as soon as
+        the page is full. Returns (records, next_start), where next_start is
+        the position the following page starts from, or None after the last
+        page.
+        """
+        positions = []
+        position = start
+        while position < len(self.store) and len(positions) <= limit:
+            stop = position + SCAN_CHUNK
+            positions.extend((np.flatnonzero(self.plan_mask(plan, position, stop)) + position).tolist())
+            position = stop
+        if len(positions) > limit:
+            return self.store.rows(positions[:limit]), positions[limit]
+        return self.store.rows(positions), None
+    
+    def _records(self, mask, limit=None):
+        """Get the rows selected by a boolean mask as dicts, in file order.
+        
+        Only the first limit rows are materialized. Returns (records, total),
+        where total counts every selected row.
+        """
+        positions = np.flatnonzero(mask)
+        return self.store.rows(positions[:limit].tolist()), len(positions)
+    
+    def get_sample(self):
+        """Get the first record, for examples on the homepage"""
+        if self.store is not None and len(self.store):
+            return self.store.row(0)
+        return None
+    
     def get_unique_banks(self):
         """Get list of unique banks"""
-        if self.data is not None:
-            return sorted(self.data['BANK'].unique())
+        if self.store is not None:
+            return sorted(self.store['BANK'].table)
         return []
     
     def get_unique_cities(self):
         """Get list of unique cities"""
-        if self.data is not None:
+        if self.store is not None:
             cities = set()
-            cities.update(self.data['CITY1'].unique())
-            cities.update(self.data['CITY2'].unique())
+            cities.update(self.store['CITY1'].table)
+            cities.update(self.store['CITY2'].table)
             return sorted(list(cities))
         return []
     
-    def search_by_ifsc(self, ifsc_code):
-        """Search for branch by IFSC code"""
-        if self.data is not None:
-            result = self.data[self.data['IFSC'] == ifsc_code.upper()]
-            return result.to_dict('records')
+    def get_unique_states(self):
+        """Get list of unique states"""
+        if self.store is not None:
+            return sorted(self.store['STATE'].table)
         return []
     
-    def search_by_bank_city(self, bank_name, city_name):
-        """Search branches by bank and city"""
-        if self.data is not None:
-            result = self.data[
-                (self.data['BANK'].str.contains(bank_name, case=False, na=False)) &
-                ((self.data['CITY1'].str.contains(city_name, case=False, na=False)) |
-                 (self.data['CITY2'].str.contains(city_name, case=False, na=False)))
-            ]
-            return result.to_dict('records')
+    @metrics.timed('filter')
+    def get_matching_values(self, columns, query, filters=()):
+        """Get distinct values of columns containing query.
+        
+        filters is a sequence of (columns, text) pairs; only rows where one of
+        the columns contains text are considered, for every pair. Values
+        starting with the query come first, then the rest, each in
+        alphabetical order.
+        """
+        if self.store is None:
+            return []
+        
+        mask = None
+        for filter_columns, text in filters:
+            clause = np.zeros(len(self.store), dtype=bool)
+            for col in filter_columns:
+                clause |= self.contains_mask(col, text)
+            mask = clause if mask is None else mask & clause
+        
+        values = set()
+        for col in columns:
+            column = self.store[col]
+            value_ids = self.text_index[col].search(query)
+            if mask is not None:
+                value_ids = np.intersect1d(value_ids, column.codes[mask])
+            values.update(column.table[value_id] for value_id in value_ids.tolist())
+        
+        query = query.casefold()
+        return sorted(values, key=lambda value: (not value.casefold().startswith(query), value.casefold()))
+    
+    @metrics.timed('filter')
+    def get_facet_values(self, level, query, filters, limit=10):
+        """Get up to limit values of a form field (bank, state, city or branch) containing query.
+        
+        filters maps outer levels to the text entered for them; empty ones
+        are ignored. Like the other searches, a filter allows every value
+        containing its text. The facet index answers by merging the nodes of
+        the allowed values, and broad filters fall back to substring search.
+        """
+        if self.store is None:
+            return []
+        
+        filters = {name: text for name, text in filters.items() if text}
+        levels = list(FACET_LEVELS)
+        allowed = {levels.index(name): self._matching_value_ids(FACET_LEVELS[name], text)
+                   for name, text in filters.items()}
+        values = self.facet_index.complete(levels.index(level), query, allowed, limit)
+        if values is None:
+            values = self.get_matching_values(FACET_LEVELS[level], query,
+                                              [(FACET_LEVELS[name], text) for name, text in filters.items()])[:limit]
+        return values
+    
+    def count_ifsc_codes(self):
+        """Count the distinct IFSC codes"""
+        return len(self.ifsc_index)
+    
+    def count_branch_slugs(self):
+        """Count the distinct (bank, city, branch) slug triples"""
+        return len(self.slug_index)
+    
+    def iter_ifsc_codes(self, start=0, stop=None):
+        """Iterate over the distinct IFSC codes in file order, optionally only a slice of them"""
+        column = self.store['IFSC']
+        return (column[position] for position in self.ifsc_index.positions()[start:stop].tolist())
+    
+    def iter_branch_slugs(self, start=0, stop=None):
+        """Iterate over the distinct (bank, city, branch) slug triples in file order, optionally only a slice of them"""
+        positions = self.slug_index.positions()[start:stop]
+        columns = []
+        for col in SLUG_COLUMNS:
+            # Decode each distinct slug in the slice once
+            codes, inverse = np.unique(self.store[col].codes[positions], return_inverse=True)
+            table = self.slug_tables[col]
+            slugs = [table[code] for code in codes.tolist()]
+            columns.append([slugs[slot] for slot in inverse.tolist()])
+        return zip(*columns)
+    
+    def has_ifsc(self, ifsc_code):
+        """Check whether an exact IFSC code exists in the dataset"""
+        return self.ifsc_index is not None and ifsc_code.upper() in self.ifsc_index
+    
+    def get_by_ifsc(self, ifsc_code):
+        """Get the branch record for an exact IFSC code"""
+        if self.store is not None:
+            position = self.ifsc_index.get(ifsc_code.upper())
+            if position is not None:
+                return self.store.row(position)
+        return None
+    
+    @metrics.timed('filter')
+    def resolve_ifsc_codes(self, codes):
+        """Get the row position of each of a batch of IFSC codes, -1 for unknown codes.
+        
+        Codes are matched ignoring case by one join of their packed keys
+        against the sorted keys of the dataset; only codes that do not pack
+        into a key are looked up one by one.
+        """
+        keys = code_keys(codes)
+        positions = self.ifsc_keys.first_positions(keys)
+        for slot in np.flatnonzero(keys < 0).tolist():
+            position = self.ifsc_index.get(codes[slot].upper())
+            positions[slot] = -1 if position is None else position
+        return positions
+    
+    def get_by_slugs(self, bank_slug, city_slug, branch_slug):
+        """Get the branch record that owns a /bank/<bank>/<city>/<branch> URL"""
+        if self.store is not None:
+            position = self.slug_index.get(f"{bank_slug}/{city_slug}/{branch_slug}")
+            if position is not None:
+                return self.store.row(position)
+        return None
+    
+    def get_slug_collisions(self, bank_slug, city_slug, branch_slug):
+        """Get every record sharing a slug triple, or [] if the triple is unique"""
+        if self.store is not None:
+            position = self.slug_index.get(f"{bank_slug}/{city_slug}/{branch_slug}")
+            if position is not None:
+                return self.store.rows(self.slug_collisions.get(position).tolist())
         return []
     
-    def search_general(self, query):
-        """General search across multiple fields"""
-        if self.data is not None:
-            result = self.data[
-                (self.data['BANK'].str.contains(query, case=False, na=False)) |
-                (self.data['BRANCH'].str.contains(query, case=False, na=False)) |
-                (self.data['CITY1'].str.contains(query, case=False, na=False)) |
-                (self.data['CITY2'].str.contains(query, case=False, na=False)) |
-                (self.data['STATE'].str.contains(query, case=False, na=False)) |
-                (self.data['ADDRESS'].str.contains(query, case=False, na=False))
-            ]
-            return result.to_dict('records')
-        return []
\ No newline at end of file
+    @metrics.timed('filter')
+    def get_related_branches(self, bank_name, city_name, exclude_ifsc=(), limit=5, exact=False):
+        """Get up to limit other branches of a bank in a city (CITY1).
+        
+        With exact, bank and city must match whole values; otherwise they
+        match as case-insensitive substrings.
+        """
+        if self.store is None:
+            return []
+        
+        # Only the first limit + len(excluded) candidates can make the list
+        excluded = {ifsc.upper() for ifsc in exclude_ifsc}
+        bank, city = (self.store[col] for col in RELATED_COLUMNS)
+        if exact:
+            bank_id = bank.value_id(bank_name)
+            city_id = city.value_id(city_name)
+            if bank_id is None or city_id is None:
+                return []
+            candidates = self.related_index.get(self._related_key(bank_id, city_id))[:limit + len(excluded)]
+        else:
+            bank_ids = self.text_index[RELATED_COLUMNS[0]].search(bank_name)
+            city_ids = self.text_index[RELATED_COLUMNS[1]].search(city_name)
+            if len(bank_ids) * len(city_ids) <= len(self.related_index):
+                keys = self._related_key(np.repeat(bank_ids, len(city_ids)), np.tile(city_ids, len(bank_ids)))
+            else:
+                # Broad queries pick from the groups rather than pairing every id
+                keys = self.related_index.keys
+                keys = keys[np.isin(keys // len(city.values), bank_ids) & np.isin(keys % len(city.values), city_ids)]
+            candidates = self.related_index.get_many(keys, limit + len(excluded))
+        
+        ifsc_column = self.store['IFSC']
+        positions = []
+        for position in candidates.tolist():
+            if len(positions) >= limit:
+                break
+            if ifsc_column[position] not in excluded:
+                positions.append(position)
+        return self.store.rows(positions)
+    
+    def search_by_ifsc(self, ifsc_code):
+        """Search for branch by IFSC code"""
+        record = self.get_by_ifsc(ifsc_code)
+        return [record] if record is not None else []
+    
+    @metrics.timed('filter')
+    def search_column(self, column, query, limit=None):
+        """Search branches whose column contains query, case-insensitively; returns (records, total)"""
+        if self.store is not None:
+            return self._records(self.plan_mask([self.plan_clause([column], query)]), limit)
+        return [], 0
+    
+    @metrics.timed('filter')
+    def search_by_bank_city(self, bank_name, city_name, limit=None):
+        """Search branches by bank and city; returns (records, total)"""
+        if self.store is not None:
+            plan = [self.plan_clause(['BANK'], bank_name), self.plan_clause(['CITY1', 'CITY2'], city_name)]
+            return self._records(self.plan_mask(plan), limit)
+        return [], 0
+    
+    @metrics.timed('filter')
+    def search_bank_details(self, bank, city='', state='', branch='', limit=None):
+        """Search branches by bank name, optionally narrowed by city, state and branch; returns (records, total)"""
+        if self.store is not None:
+            return self._records(self.plan_mask(self.plan_bank_details(bank, city, state, branch)), limit)
+        return [], 0
+    
+    def relevance_scores(self, query):
+        """Score every row's best match of query in the RELEVANCE_WEIGHTS columns.
+        
+        A match scores MATCH_SCORES for its kind plus the weight of its
+        column; rows without a match score 0. Dictionary columns score each
+        matching distinct value once and spread the scores over rows by code,
+        and packed values are checked in their buffers without decoding.
+        """
+        folded = query.casefold()
+        scores = np.zeros(len(self.store), dtype=np.int32)
+        for col, weight in RELEVANCE_WEIGHTS.items():
+            column = self.store[col]
+            value_ids = self.text_index[col].search(query)
+            values = column.values
+            if isinstance(values, PackedStringColumn) and folded.isascii():
+                exact = values.starts_with(value_ids, folded, whole=True)
+                prefix = values.starts_with(value_ids, folded)
+            else:
+                folded_values = [values[value_id].casefold() for value_id in value_ids.tolist()]
+                exact = np.array([value == folded for value in folded_values], dtype=bool)
+                prefix = np.array([value.startswith(folded) for value in folded_values], dtype=bool)
+            value_scores = np.select([exact, prefix], [MATCH_SCORES['exact'], MATCH_SCORES['prefix']],
+                                     MATCH_SCORES['substring']).astype(np.int32) + weight
+            if column.kind == 'packed':
+                scores[value_ids] = np.maximum(scores[value_ids], value_scores)
+            else:
+                table_scores = np.zeros(len(values), dtype=np.int32)
+                table_scores[value_ids] = value_scores
+                np.maximum(scores, table_scores[column.codes], out=scores)
+        return scores
+    
+    def ranking(self, kind, query):
+        """Get the positions of every row matching query, ranked by relevance or fuzzy.
+        
+        Rankings are cached by this loader, so for one dataset version, and
+        the least recently used are dropped once they hold more than
+        RANKING_CACHE_POSITIONS positions.
+        """
+        key = (kind, query.casefold())
+        with self._rankings_lock:
+            positions = self._rankings.get(key)
+            if positions is not None:
+                self._rankings.move_to_end(key)
+                return positions
+        
+        if kind == 'relevance':
+            positions = top_positions(self.relevance_scores(query))
+        else:
+            positions = self.fuzzy_ranking(query)
+        positions = positions.astype(np.int32)
+        with self._rankings_lock:
+            self._rankings[key] = positions
+            cached = sum(len(ranked) for ranked in self._rankings.values())
+            while cached > RANKING_CACHE_POSITIONS and len(self._rankings) > 1:
+                cached -= len(self._rankings.popitem(last=False)[1])
+        return positions
+    
+    @metrics.timed('filter')
+    def search_general(self, query, limit=None, start=0):
+        """General search across multiple fields, most relevant first by relevance_scores().
+        
+        Returns (records, total) of the limit records from rank start on.
+        Later pages slice the cached ranking() instead of scoring every row
+        again.
+        """
+        if self.store is not None and start:
+            positions = self.ranking('relevance', query)
+            stop = None if limit is None else start + limit
+            return self.store.rows(positions[start:stop].tolist()), len(positions)
+        if self.store is not None:
+            scores = self.relevance_scores(query)
+            positions = top_positions(scores, None if limit is None else start + limit)[start:]
+            return self.store.rows(positions.tolist()), int(np.count_nonzero(scores))
+        return [], 0
+    
+    def fuzzy_ranking(self, query):
+        """Get the positions of rows matching every word of query, allowing typos.
+        
+        Each word matches as written or as one of the FUZZY_SPELLINGS closest
+        words of FUZZY_COLUMNS within fuzzy_edits() of it, as a substring of
+        any of those columns. Rows are ranked by the edits their best matches
+        take in total, then in file order.
+        """
+        words = WORD_RE.findall(query.casefold())
+        matched = np.full(len(self.store), bool(words))
+        edits = np.zeros(len(self.store), dtype=np.int32)
+        for word in words:
+            spellings = {word: 0}
+            for spelling, distance in self.fuzzy_index.matches(word, fuzzy_edits(word), FUZZY_SPELLINGS):
+                spellings.setdefault(spelling, distance)
+            
+            # One pass per distance, over the value ids of all its spellings
+            best = np.full(len(self.store), -1, dtype=np.int32)
+            for distance in sorted(set(spellings.values())):
+                group = [spelling for spelling, edit in spellings.items() if edit == distance]
+                hits = np.zeros(len(self.store), dtype=bool)
+                for col in FUZZY_COLUMNS:
+                    value_ids = np.unique(np.concatenate([self.text_index[col].search(spelling) for spelling in group]))
+                    hits |= self.store[col].value_mask(value_ids)
+                best[hits & (best < 0)] = distance
+            matched &= best >= 0
+            edits += best
+        
+        positions = np.flatnonzero(matched)
+        return positions[np.argsort(edits[positions], kind='stable')]
+    
+    @metrics.timed('filter')
+    def search_fuzzy(self, query, limit=None, start=0):
+        """Search like search_general(), tolerating typos, ranked by fuzzy_ranking().
+        
+        Returns (records, total) of the limit records from rank start on.
+        Every page ranks all matches, so the ranking is cached for the next.
+        """
+        if self.store is not None:
+            positions = self.ranking('fuzzy', query)
+            stop = None if limit is None else start + limit
+            return self.store.rows(positions[start:stop].tolist()), len(positions)
+        return [], 0
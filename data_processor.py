@@ -1,16 +1,20 @@
 import pandas as pd
+import numpy as np
 import os
 import logging
 from urllib.parse import quote
 import re
 from datetime import datetime
+import sitemap
 
 class BankDataProcessor:
     def __init__(self, csv_files=['bank_data_1.csv', 'bank_data_2.csv']):
         self.csv_files = csv_files
         self.data = None
+        self.ifsc_index = {}
+        self.slug_index = {}
         self.load_data()
-        
+    
     def load_data(self):
         """Load data from CSV files"""
         try:
@@ -49,6 +53,16 @@ class BankDataProcessor:
                 # Fill NaN values with empty strings
                 self.data = self.data.fillna('')
                 
+                # Index row positions by IFSC for exact lookups
+                self.ifsc_index = {}
+                for position, ifsc in enumerate(self.data['IFSC'].astype(str).str.upper()):
+                    if ifsc:
+                        self.ifsc_index.setdefault(ifsc, position)
+                
+                # Index row positions by (bank, city, branch) slugs; the first
+                # row wins when several branches share the same slugs
+                self.slug_index = self._build_slug_index()
+                
                 logging.info(f"Combined dataset: {len(self.data)} total records")
             else:
                 logging.warning("No CSV files found. Using empty dataset.")
@@ -66,13 +80,39 @@ class BankDataProcessor:
         slug = re.sub(r'\s+', '-', slug)
         return slug.strip('-')
     
-    def search(self, query, search_type='auto'):
+    def _build_slug_index(self):
+        """Map (bank, city, branch) slug triples to the first matching row position"""
+        slug_cache = {}
+        def cached_slug(text):
+            if text not in slug_cache:
+                slug_cache[text] = self.create_slug(text)
+            return slug_cache[text]
+        
+        index = {}
+        collisions = 0
+        keys = zip(self.data['Bank Name'], self.data['City'], self.data['Branch'])
+        for position, (bank, city, branch) in enumerate(keys):
+            key = (cached_slug(bank), cached_slug(city), cached_slug(branch))
+            if index.setdefault(key, position) != position:
+                collisions += 1
+        
+        if collisions:
+            logging.warning(f"{collisions} rows share a bank/city/branch slug with an earlier row")
+        return index
+    
+    def search(self, query, search_type='auto', limit=50):
         """Search for bank information based on query and type"""
+        return self.search_with_total(query, search_type, limit)[0]
+    
+    def search_with_total(self, query, search_type='auto', limit=50):
+        """Search like search(), returning (results, total) where total counts every match.
+        
+        Only the first limit matches, in file order, are converted to dicts.
+        """
         if self.data is None or len(self.data) == 0:
-            return []
+            return [], 0
         
         query = query.strip().upper()
-        results = []
         
         if search_type == 'auto':
             # Auto-detect search type based on query format
@@ -85,14 +125,12 @@ class BankDataProcessor:
         
         if search_type == 'ifsc':
             # Search by IFSC code
-            matches = self.data[self.data['IFSC'].str.upper().str.contains(query, na=False)]
-            results = matches.to_dict('records')
-            
+            mask = self.data['IFSC'].str.upper().str.contains(query, na=False)
+        
         elif search_type == 'micr':
             # Search by MICR code
-            matches = self.data[self.data['MICR'].str.contains(query, na=False)]
-            results = matches.to_dict('records')
-            
+            mask = self.data['MICR'].str.contains(query, na=False)
+        
         elif search_type == 'bank':
             # Search by bank name, city, or branch
             mask = (
@@ -100,20 +138,22 @@ class BankDataProcessor:
                 self.data['City'].str.upper().str.contains(query, na=False) |
                 self.data['Branch'].str.upper().str.contains(query, na=False)
             )
-            matches = self.data[mask]
-            results = matches.to_dict('records')
         
-        return results[:50]  # Limit results for performance
+        else:
+            return [], 0
+        
+        positions = np.flatnonzero(mask.to_numpy(dtype=bool))
+        return self.data.iloc[positions[:limit]].to_dict('records'), len(positions)
     
     def get_by_ifsc(self, ifsc_code):
         """Get bank information by IFSC code"""
         if self.data is None or len(self.data) == 0:
             return None
         
-        matches = self.data[self.data['IFSC'].str.upper() == ifsc_code.upper()]
+        position = self.ifsc_index.get(ifsc_code.upper())
         
-        if len(matches) > 0:
-            return matches.iloc[0].to_dict()
+        if position is not None:
+            return self.data.iloc[position].to_dict()
         return None
     
     def get_by_bank_city_branch(self, bank_slug, city, branch):
@@ -121,17 +161,11 @@ class BankDataProcessor:
         if self.data is None or len(self.data) == 0:
             return None
         
-        # Convert slugs back to original format for matching
-        city_original = city.replace('-', ' ').title()
-        branch_original = branch.replace('-', ' ').title()
-        
-        # Find matching records
-        for _, row in self.data.iterrows():
-            if (self.create_slug(row['Bank Name']) == bank_slug and
-                self.create_slug(row['City']) == city.lower() and
-                self.create_slug(row['Branch']) == branch.lower()):
-                return row.to_dict()
+        # Find matching record
+        position = self.slug_index.get((bank_slug, city.lower(), branch.lower()))
         
+        if position is not None:
+            return self.data.iloc[position].to_dict()
         return None
     
     def get_suggestions(self, query):
@@ -171,57 +205,33 @@ class BankDataProcessor:
         
         return suggestions[:10]
     
-    def generate_sitemap(self):
-        """Generate XML sitemap for SEO"""
+    def iter_sitemap_entries(self):
+        """Generate (loc, lastmod, changefreq, priority) for every page of the sitemap"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        yield ('http://localhost:5000/', today, 'daily', '1.0')
         if self.data is None or len(self.data) == 0:
-            return """<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-    <url>
-        <loc>http://localhost:5000/</loc>
-        <lastmod>{}</lastmod>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-</urlset>""".format(datetime.now().strftime('%Y-%m-%d'))
-        
-        sitemap_xml = """<?xml version="1.0" encoding="UTF-8"?>
-<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-    <url>
-        <loc>http://localhost:5000/</loc>
-        <lastmod>{}</lastmod>
-        <changefreq>daily</changefreq>
-        <priority>1.0</priority>
-    </url>
-""".format(datetime.now().strftime('%Y-%m-%d'))
+            return
         
         # Add IFSC pages
         for ifsc in self.data['IFSC'].unique():
             if ifsc:
-                sitemap_xml += f"""    <url>
-        <loc>http://localhost:5000/ifsc/{ifsc}</loc>
-        <lastmod>{datetime.now().strftime('%Y-%m-%d')}</lastmod>
-        <changefreq>monthly</changefreq>
-        <priority>0.8</priority>
-    </url>
-"""
-        
-        # Add bank/city/branch pages
-        for _, row in self.data.iterrows():
-            if row['Bank Name'] and row['City'] and row['Branch']:
-                bank_slug = self.create_slug(row['Bank Name'])
-                city_slug = self.create_slug(row['City'])
-                branch_slug = self.create_slug(row['Branch'])
-                
-                sitemap_xml += f"""    <url>
-        <loc>http://localhost:5000/bank/{quote(bank_slug)}/{quote(city_slug)}/{quote(branch_slug)}</loc>
-        <lastmod>{datetime.now().strftime('%Y-%m-%d')}</lastmod>
-        <changefreq>monthly</changefreq>
-        <priority>0.7</priority>
-    </url>
-"""
-        
-        sitemap_xml += "</urlset>"
-        return sitemap_xml
+                yield (f'http://localhost:5000/ifsc/{ifsc}', today, 'monthly', '0.8')
+        
+        # Add bank/city/branch pages, slugifying each distinct value once
+        slugs = {}
+        def quoted_slug(text):
+            if text not in slugs:
+                slugs[text] = quote(self.create_slug(text))
+            return slugs[text]
+        
+        for bank, city, branch in zip(self.data['Bank Name'], self.data['City'], self.data['Branch']):
+            if bank and city and branch:
+                loc = f'http://localhost:5000/bank/{quoted_slug(bank)}/{quoted_slug(city)}/{quoted_slug(branch)}'
+                yield (loc, today, 'monthly', '0.7')
+    
+    def generate_sitemap(self):
+        """Generate XML sitemap for SEO"""
+        return ''.join(sitemap.iter_urlset(self.iter_sitemap_entries()))
     
     def get_all_banks(self):
         """Get all unique banks"""
@@ -0,0 +1,139 @@
+"""Reloading the bank dataset while the app keeps serving.
+
+LiveDataset holds this process's loaded BankDataLoader. A reload builds a
+complete new loader on a background thread, bringing the binary snapshot up
+to date first under a file lock so only one worker rebuilds it, and then
+swaps it in with a single assignment. A loader is never modified once
+loaded, and requests take the reference once and keep it, so a request in
+flight during a swap finishes on the dataset it started with.
+
+Reloads start when a watcher thread sees the source CSV files or the
+snapshot manifest change, or on demand. Watching the manifest carries a
+snapshot rebuilt by one worker, or by `python snapshot.py`, to every worker.
+"""
+import fcntl
+import logging
+import os
+import threading
+import time
+import snapshot
+from data_loader import BankDataLoader
+
+# Seconds between checks of the source files for changes; 0 disables watching
+WATCH_INTERVAL = float(os.environ.get('DATA_WATCH_INTERVAL', 60))
+
+def file_stats(paths):
+    """Get (path, mtime, size) of each path, None for missing files"""
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stats.append((path, None, None))
+    return stats
+
+class LiveDataset:
+    """The current dataset of this process, replaced atomically by background reloads"""
+    
+    def __init__(self, factory=BankDataLoader, interval=WATCH_INTERVAL):
+        self.factory = factory
+        self.interval = interval
+        self.loader = None
+        self.status = {'version': None, 'rows': 0, 'reloading': False, 'reloads': 0,
+                       'loaded_at': None, 'last_error': None}
+        self._lock = threading.Lock()
+        self._seen = None
+        self._pid = None
+    
+    def get(self):
+        """Get the current loader, loading the first one in the calling thread"""
+        loader = self.loader
+        if loader is None:
+            with self._lock:
+                if self.loader is None:
+                    loader = self.factory()
+                    seen = self._watched_stats(loader)
+                    loader.load_data()
+                    self._swap(loader, seen)
+            loader = self.loader
+        self._start_watch()
+        return loader
+    
+    def reload(self):
+        """Start a background reload unless one is running; returns whether one started"""
+        with self._lock:
+            if self.status['reloading']:
+                return False
+            self.status['reloading'] = True
+        threading.Thread(target=self._reload, name='data-reload', daemon=True).start()
+        return True
+    
+    def _watched_stats(self, loader):
+        stats = file_stats(loader.csv_files)
+        if loader.snapshot_dir:
+            stats += file_stats([os.path.join(loader.snapshot_dir, snapshot.MANIFEST)])
+        return stats
+    
+    def _swap(self, loader, seen):
+        self.loader = loader
+        self._seen = seen
+        self.status.update(version=loader.version, rows=len(loader.store), loaded_at=time.time())
+    
+    def _refresh_snapshot(self, loader):
+        """Rebuild the snapshot if the sources are newer, one process at a time"""
+        directory = os.path.abspath(loader.snapshot_dir)
+        lock_path = os.path.join(os.path.dirname(directory), f".{os.path.basename(directory)}.lock")
+        with open(lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not snapshot.is_fresh(loader.snapshot_dir, loader.csv_files):
+                snapshot.build(loader.snapshot_dir)
+    
+    def _reload(self):
+        started = time.time()
+        loader = self.factory()
+        # Sources are stat'ed before the rebuild, so a change during it
+        # triggers another reload, and the manifest after, so the rebuild
+        # itself does not
+        sources = file_stats(loader.csv_files)
+        try:
+            if loader.snapshot_dir:
+                self._refresh_snapshot(loader)
+            loader.load_data()
+            current = self.loader
+            if len(loader.store) == 0 and current is not None and len(current.store) > 0:
+                raise ValueError("the new dataset is empty")
+            error = None
+        except Exception as e:
+            logging.error(f"Dataset reload failed, keeping version {self.status['version']}: {e}")
+            error = str(e)
+        seen = sources + self._watched_stats(loader)[len(sources):]
+        
+        with self._lock:
+            if error is None:
+                self._swap(loader, seen)
+                self.status['reloads'] += 1
+            else:
+                # Not retried until the files change again
+                self._seen = seen
+            self.status.update(reloading=False, last_error=error)
+        if error is None:
+            logging.info(f"Reloaded dataset {loader.version} with {len(loader.store)} rows "
+                         f"in {time.time() - started:.1f}s")
+    
+    def _start_watch(self):
+        """Start this process's watcher thread, if watching and not running yet"""
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._watch, name='data-watch', daemon=True).start()
+    
+    def _watch(self):
+        while True:
+            time.sleep(self.interval)
+            loader = self.loader
+            if loader is not None and self._watched_stats(loader) != self._seen:
+                if self.reload():
+                    logging.info("Dataset files changed, reloading")
@@ -0,0 +1,68 @@
+"""Apply a delta file of IFSC changes to the binary snapshot without a rebuild.
+
+A delta is a CSV file with the dataset's columns plus an ACTION column: rows
+whose ACTION is 'close' remove their IFSC code, and every other row replaces
+the row of its code or adds it if the code is new. Columns left out are
+empty. The current snapshot is loaded, patched and written back with a new
+dataset version, and the applied file is recorded in its manifest. Workers
+serving the snapshot pick the new one up like any rebuilt snapshot.
+
+The snapshot must be at least as new as the CSV files, since a rebuild from
+them would discard every applied delta; fold deltas into the CSV files before
+replacing them.
+    
+    python delta.py changes.csv [--snapshot DIR]
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+import snapshot
+from data_loader import CSV_FILES, SNAPSHOT_DIR, BankDataLoader
+
+def file_digest(path):
+    """Get the SHA-1 hex digest of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def apply_delta_file(path, directory=SNAPSHOT_DIR, csv_files=CSV_FILES):
+    """Apply the delta file at path to the snapshot in directory; returns its new manifest"""
+    if not snapshot.is_fresh(directory, csv_files):
+        raise ValueError(f"No snapshot in {directory} as new as the CSV files; run snapshot.py first")
+    
+    started = time.time()
+    previous = snapshot.read_manifest(directory)
+    loader = BankDataLoader(csv_files, directory)
+    loader.load_snapshot()
+    updated, counts = loader.apply_delta(loader.read_delta(path))
+    
+    sha1 = file_digest(path)
+    updated.version = hashlib.sha1(f"{loader.version}:{sha1}".encode('utf-8')).hexdigest()[:12]
+    deltas = previous.get('deltas', []) + [{'file': os.path.basename(path), 'sha1': sha1, **counts}]
+    manifest = snapshot.write_snapshot(directory, updated, updated.version, deltas)
+    logging.info(f"Applied {path} to snapshot {loader.version}, now {updated.version} with "
+                 f"{manifest['rows']} rows, in {time.time() - started:.1f}s")
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a delta file of IFSC changes to the binary snapshot")
+    parser.add_argument('delta', help="CSV file of closed, changed and added rows")
+    parser.add_argument('--snapshot', default=SNAPSHOT_DIR, help="snapshot directory")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    try:
+        manifest = apply_delta_file(args.delta, args.snapshot)
+    except (OSError, ValueError) as e:
+        logging.error(f"Delta not applied: {e}")
+        return 1
+    logging.info(f"Counts: {manifest['deltas'][-1]}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Offline enrichment of CSV files of IFSC codes with the bank dataset.
+
+Reads the input in chunks of rows, resolves each chunk's codes against the
+loaded dataset in one batch join, and appends the enriched chunk to the
+output before reading the next, so memory stays bounded by the chunk size
+whatever the size of the input. With --workers, chunks are enriched by a
+pool of processes, at most two chunks per worker in flight, and written in
+input order.
+    
+    python enrich.py payouts.csv enriched.csv [--column IFSC] [--workers 4]
+"""
+import argparse
+import collections
+import logging
+import multiprocessing
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_loader import CSV_FILES, DATA_COLUMNS, SNAPSHOT_DIR, BankDataLoader
+
+# Input rows enriched per chunk
+CHUNK_ROWS = 50000
+
+# Dataset fields added to every row by default
+ENRICH_FIELDS = [col for col in DATA_COLUMNS if col != 'IFSC']
+
+# Added column telling whether the row's code was found
+FOUND_COLUMN = 'IFSC_FOUND'
+
+# Loader of the current process; workers inherit it on fork or load their own
+_loader = None
+
+def _load(csv_files=CSV_FILES, snapshot_dir=SNAPSHOT_DIR):
+    global _loader
+    if _loader is None:
+        _loader = BankDataLoader(csv_files, snapshot_dir)
+        _loader.load_data()
+    return _loader
+
+def enrich_chunk(chunk, column, fields, prefix=''):
+    """Add the dataset fields of each row's IFSC code to a chunk of rows"""
+    loader = _load()
+    codes = chunk[column].fillna('').astype(str).str.strip().tolist()
+    positions = loader.resolve_ifsc_codes(codes)
+    found = positions >= 0
+    
+    for field in fields:
+        values = np.full(len(chunk), '', dtype=object)
+        values[found] = loader.store[field].take(positions[found])
+        chunk[prefix + field] = values
+    chunk[prefix + FOUND_COLUMN] = np.where(found, 'Y', 'N')
+    return chunk
+
+def render_chunk(chunk, column, fields, prefix, header):
+    """Enrich a chunk and render it as CSV text; returns (text, rows found)"""
+    chunk = enrich_chunk(chunk, column, fields, prefix)
+    return chunk.to_csv(index=False, header=header), int((chunk[prefix + FOUND_COLUMN] == 'Y').sum())
+
+def enrich_file(input_path, output, column='IFSC', fields=ENRICH_FIELDS, prefix='',
+                chunk_rows=CHUNK_ROWS, workers=0):
+    """Enrich input_path into the open text file output chunk by chunk; returns (rows, rows found)"""
+    chunks = pd.read_csv(input_path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    rows = found = 0
+    
+    def write(result, chunk_rows):
+        nonlocal rows, found
+        text, chunk_found = result
+        output.write(text)
+        rows += chunk_rows
+        found += chunk_found
+        logging.info(f"Enriched {rows} rows, {found} found")
+    
+    if workers <= 0:
+        for number, chunk in enumerate(chunks):
+            write(render_chunk(chunk, column, fields, prefix, number == 0), len(chunk))
+        return rows, found
+    
+    # Workers enrich and render chunks; this process only parses and writes,
+    # keeping at most two chunks per worker in flight
+    with multiprocessing.Pool(workers, initializer=_load) as pool:
+        pending = collections.deque()
+        for number, chunk in enumerate(chunks):
+            pending.append((pool.apply_async(render_chunk, (chunk, column, fields, prefix, number == 0)), len(chunk)))
+            if len(pending) >= 2 * workers:
+                result, chunk_rows = pending.popleft()
+                write(result.get(), chunk_rows)
+        while pending:
+            result, chunk_rows = pending.popleft()
+            write(result.get(), chunk_rows)
+    return rows, found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enrich a CSV file of IFSC codes with bank branch details")
+    parser.add_argument('input', help="CSV file with a column of IFSC codes")
+    parser.add_argument('output', help="CSV file to write, '-' for standard output")
+    parser.add_argument('--column', default='IFSC', help="name of the input column holding IFSC codes")
+    parser.add_argument('--fields', default=','.join(ENRICH_FIELDS), help="comma-separated dataset fields to add")
+    parser.add_argument('--prefix', default='', help="prefix for the names of added columns")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="input rows per chunk")
+    parser.add_argument('--workers', type=int, default=0, help="worker processes; 0 enriches in this process")
+    args = parser.parse_args(argv)
+    
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in DATA_COLUMNS]
+    if unknown:
+        parser.error(f"unknown fields: {', '.join(unknown)}")
+    
+    header = pd.read_csv(args.input, dtype=str, nrows=0).columns
+    if args.column not in header:
+        parser.error(f"{args.input} has no column {args.column!r}")
+    clashes = [name for name in [args.prefix + field for field in fields] + [args.prefix + FOUND_COLUMN]
+               if name in header]
+    if clashes:
+        parser.error(f"added columns would overwrite input columns {', '.join(clashes)}; pass --prefix")
+    
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    started = time.time()
+    _load()
+    if args.output == '-':
+        rows, found = enrich_file(args.input, sys.stdout, args.column, fields, args.prefix,
+                                  args.chunk_rows, args.workers)
+    else:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            rows, found = enrich_file(args.input, output, args.column, fields, args.prefix,
+                                      args.chunk_rows, args.workers)
+    logging.info(f"Enriched {rows} rows ({found} found, {rows - found} not found) in {time.time() - started:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
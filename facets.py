@@ -0,0 +1,167 @@
+"""Facet index over the bank -> state -> city -> branch hierarchy.
+
+For every level it records the distinct values found under each combination
+of parent values, any parent level possibly left open. A node is addressed
+by one integer key built from the parent value ids, and its value ids are
+stored sorted by casefolded value, so completing a cascading form field is
+one key lookup plus a bisect for the typed prefix.
+"""
+import bisect
+import itertools
+import numpy as np
+from search_index import PREFIX_END, GroupIndex
+
+# Nodes larger than this are not scanned for substring matches
+SCAN_LIMIT = 5000
+
+# Combinations of filtered parent values merged at most to answer one query
+NODE_LIMIT = 5000
+
+class FacetIndex:
+    """Distinct values of each level under every combination of parent values.
+    
+    vocabs[i] holds the distinct values of level i, addressed by value id. A
+    node key is the sum over filtered parent levels p of
+    (value id + 1) * multipliers[p], so 0 stands for an open level.
+    """
+    
+    def __init__(self, vocabs, orders, groups):
+        self.vocabs = vocabs
+        self.orders = orders
+        self.groups = groups
+        self.multipliers = [1]
+        for vocab in vocabs[:-1]:
+            self.multipliers.append(self.multipliers[-1] * (len(vocab) + 1))
+    
+    @staticmethod
+    def _orders(vocabs):
+        return [np.array(sorted(range(len(vocab)), key=lambda value_id: vocab[value_id].casefold()),
+                         dtype=np.int32) for vocab in vocabs]
+    
+    @staticmethod
+    def _ranks(order):
+        """Get the position of every value id in order"""
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank
+    
+    def _level_pairs(self, level, row_ids, rank):
+        """Get every (node key, value rank) pair of some rows at a level, as node key * size + rank"""
+        # One pair per row for every choice of filtered parent levels and of
+        # source columns at each level
+        combined = [np.zeros(0, dtype=np.int64)]
+        for filtered in itertools.product([False, True], repeat=level):
+            parents = [parent for parent in range(level) if filtered[parent]]
+            for columns in itertools.product(*(row_ids[parent] for parent in parents), row_ids[level]):
+                keys = np.zeros(len(columns[-1]), dtype=np.int64)
+                for parent, ids in zip(parents, columns):
+                    keys += (ids.astype(np.int64) + 1) * self.multipliers[parent]
+                combined.append(keys * len(rank) + rank[columns[-1]])
+        return np.concatenate(combined)
+    
+    @classmethod
+    def build(cls, vocabs, row_ids):
+        """Index rows given, for each level, one array of value ids per source column"""
+        orders = cls._orders(vocabs)
+        index = cls(vocabs, orders, [])
+        
+        for level, vocab in enumerate(vocabs):
+            size = len(vocab)
+            if size == 0:
+                index.groups.append(GroupIndex.build([], []))
+                continue
+            combined = np.unique(index._level_pairs(level, row_ids, cls._ranks(orders[level])))
+            index.groups.append(GroupIndex.build(combined // size, orders[level][combined % size]))
+        return index
+    
+    def updated(self, vocabs, remaps, row_ids, affected):
+        """Get the index of updated rows.
+        
+        vocabs and row_ids describe the new rows as for build(); remaps gives
+        per level the new id of every old value id (-1 if gone), and affected
+        per level the new ids of every value held by a row added, changed or
+        removed at that level. Pairs of other values are still backed by the
+        same untouched rows, so they are only re-keyed; the pairs of affected
+        values are recomputed from just the rows holding them.
+        """
+        index = FacetIndex(vocabs, self._orders(vocabs), [])
+        for level, vocab in enumerate(vocabs):
+            size = len(vocab)
+            if size == 0:
+                index.groups.append(GroupIndex.build([], []))
+                continue
+            rank = self._ranks(index.orders[level])
+            
+            group = self.groups[level]
+            old_keys = np.repeat(group.keys, np.diff(group.offsets))
+            values = remaps[level][group.positions]
+            alive = (values >= 0) & ~np.isin(values, affected[level])
+            keys = np.zeros(len(old_keys), dtype=np.int64)
+            for parent in range(level):
+                digits = old_keys // self.multipliers[parent] % (len(self.vocabs[parent]) + 1)
+                parent_ids = np.where(digits > 0, remaps[parent][digits - 1], -1)
+                alive &= (digits == 0) | (parent_ids >= 0)
+                keys += (parent_ids + 1) * index.multipliers[parent]
+            kept = keys[alive] * size + rank[values[alive]]
+            
+            rows = np.zeros(len(row_ids[level][0]), dtype=bool)
+            for ids in row_ids[level]:
+                rows |= np.isin(ids, affected[level])
+            subset = [[ids[rows] for ids in level_ids] for level_ids in row_ids[:level + 1]]
+            combined = np.unique(np.concatenate([kept, index._level_pairs(level, subset, rank)]))
+            index.groups.append(GroupIndex.build(combined // size, index.orders[level][combined % size]))
+        return index
+    
+    @classmethod
+    def from_arrays(cls, vocabs, arrays):
+        """Rebuild an index over vocabs from the arrays of to_arrays()"""
+        return cls(vocabs, [level_arrays['order'] for level_arrays in arrays],
+                   [GroupIndex.from_arrays(level_arrays) for level_arrays in arrays])
+    
+    def to_arrays(self):
+        """Get one dict of arrays per level"""
+        return [dict(group.to_arrays(), order=order) for group, order in zip(self.groups, self.orders)]
+    
+    def complete(self, level, query, filters, limit):
+        """Get up to limit values at a level containing query under the filtered parents.
+        
+        filters maps parent levels to the ids of the values they allow, such
+        as every value containing the text typed for them; the nodes of all
+        allowed combinations are merged. Values starting with the query come
+        first, then values containing it anywhere, each in alphabetical
+        order. Returns None when the index cannot answer: the filters allow
+        more than NODE_LIMIT combinations, or more than SCAN_LIMIT values would
+        need scanning to fill the substring matches.
+        """
+        keys = np.zeros(1, dtype=np.int64)
+        for parent, value_ids in filters.items():
+            value_ids = np.asarray(value_ids, dtype=np.int64)
+            if len(keys) * len(value_ids) > NODE_LIMIT:
+                return None
+            keys = (keys[:, None] + (value_ids + 1) * self.multipliers[parent]).ravel()
+        
+        group = self.groups[level]
+        if len(keys) == 1:
+            ids = group.get(keys[0])
+        else:
+            # A value may sit in several nodes; merge them back into case-insensitive order
+            ids = np.unique(group.get_many(np.unique(keys)))
+            ids = ids[np.argsort(self._ranks(self.orders[level])[ids])]
+        
+        vocab = self.vocabs[level]
+        query = query.casefold()
+        entries = range(len(ids))
+        fold = lambda entry: vocab[ids[entry]].casefold()
+        lo = bisect.bisect_left(entries, query, key=fold)
+        hi = bisect.bisect_left(entries, query + PREFIX_END, lo=lo, key=fold)
+        
+        found = [vocab[value_id] for value_id in ids[lo:min(hi, lo + limit)].tolist()]
+        if len(found) < limit:
+            if len(ids) > SCAN_LIMIT:
+                return None
+            for value_id in itertools.chain(ids[:lo].tolist(), ids[hi:].tolist()):
+                if query in vocab[value_id].casefold():
+                    found.append(vocab[value_id])
+                    if len(found) >= limit:
+                        break
+        return found
@@ -0,0 +1,16 @@
+"""Gunicorn settings for serving every worker from one shared snapshot.
+
+Gunicorn reads this file from the working directory on start. The master
+brings the binary snapshot up to date once, before any worker starts, and
+every worker then memory-maps the same read-only arrays file instead of
+parsing the CSVs into its own heap. The dataset's pages are held once in the
+page cache, so memory stays flat as workers are added. Point
+BANK_DATA_SNAPSHOT at a tmpfs such as /dev/shm to keep them off disk entirely.
+"""
+import snapshot
+from data_loader import CSV_FILES, SNAPSHOT_DIR
+
+def on_starting(server):
+    if not snapshot.is_fresh(SNAPSHOT_DIR, CSV_FILES):
+        server.log.info(f"Building dataset snapshot in {SNAPSHOT_DIR}")
+        snapshot.build(SNAPSHOT_DIR)
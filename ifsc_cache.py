@@ -0,0 +1,118 @@
+"""Cache of upstream IFSC lookups, shared by every worker through SQLite.
+
+Each entry is the JSON of one lookup result keyed by IFSC code, including
+codes the upstream does not know (stored as null) so repeated misses do not
+go back to the network either. Found and not-found results expire after
+separate TTLs, and the least recently used entries are evicted once the
+cache grows past its size bound.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.environ.get('IFSC_CACHE_PATH', 'ifsc_cache.sqlite3')
+CACHE_SIZE = int(os.environ.get('IFSC_CACHE_SIZE', 50000))
+CACHE_TTL = int(os.environ.get('IFSC_CACHE_TTL', 7 * 24 * 3600))
+NEGATIVE_TTL = int(os.environ.get('IFSC_CACHE_NEGATIVE_TTL', 3600))
+
+# Recency is only rewritten when older than this many seconds, so hot entries
+# do not turn every read into a write
+TOUCH_INTERVAL = 60
+
+# Evict down to the size bound once every this many writes
+TRIM_INTERVAL = 100
+
+class IFSCCache:
+    """Bounded LRU cache of IFSC lookup results with TTL and negative TTL"""
+    
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_SIZE, ttl=CACHE_TTL, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.counters = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'expired': 0, 'errors': 0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+    
+    def _connection(self):
+        """Get this thread's connection, opening one after start or fork"""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS ifsc_cache ('
+                               'code TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ifsc_cache_used ON ifsc_cache (used)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+    
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+    
+    def get(self, code):
+        """Look up a code; returns (found, value), where value None is a cached miss"""
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute('SELECT value, expires, used FROM ifsc_cache WHERE code = ?',
+                                     (code,)).fetchone()
+            if row is not None and row[1] <= now:
+                connection.execute('DELETE FROM ifsc_cache WHERE code = ? AND expires <= ?', (code, now))
+                self._count('expired')
+                row = None
+            if row is not None and row[2] < now - TOUCH_INTERVAL:
+                connection.execute('UPDATE ifsc_cache SET used = ? WHERE code = ?', (now, code))
+        except sqlite3.Error as e:
+            logging.error(f"Error reading IFSC cache {self.path}: {e}")
+            self._count('errors')
+            row = None
+        
+        if row is None:
+            self._count('misses')
+            return False, None
+        value = json.loads(row[0])
+        self._count('hits' if value is not None else 'negative_hits')
+        return True, value
+    
+    def set(self, code, value):
+        """Store a lookup result; None records that the code does not exist upstream"""
+        now = time.time()
+        ttl = self.ttl if value is not None else self.negative_ttl
+        try:
+            connection = self._connection()
+            connection.execute('INSERT OR REPLACE INTO ifsc_cache (code, value, expires, used) VALUES (?, ?, ?, ?)',
+                               (code, json.dumps(value), now + ttl, now))
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % TRIM_INTERVAL == 0
+            if trim:
+                self.trim()
+        except sqlite3.Error as e:
+            logging.error(f"Error writing IFSC cache {self.path}: {e}")
+            self._count('errors')
+    
+    def trim(self):
+        """Drop expired entries, then the least recently used ones beyond the size bound"""
+        connection = self._connection()
+        connection.execute('DELETE FROM ifsc_cache WHERE expires <= ?', (time.time(),))
+        connection.execute('DELETE FROM ifsc_cache WHERE code IN ('
+                           'SELECT code FROM ifsc_cache ORDER BY used DESC LIMIT -1 OFFSET ?)',
+                           (self.max_entries,))
+    
+    def stats(self):
+        """Get this process's hit/miss counters and the number of shared entries"""
+        with self._lock:
+            stats = dict(self.counters)
+        try:
+            stats['entries'] = self._connection().execute('SELECT COUNT(*) FROM ifsc_cache').fetchone()[0]
+        except sqlite3.Error:
+            stats['entries'] = None
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['negative_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,113 @@
+"""Lookups against the upstream IFSC API (Razorpay) and their background refresh.
+
+The local dataset answers IFSC pages; the upstream only fills in fields the
+dataset lacks and codes newer than it. UpstreamRefresher fetches codes on a
+background thread into the shared IFSCCache, so a page view never waits on
+the network for a code the dataset already has.
+"""
+import logging
+import os
+import queue
+import threading
+import requests
+from metrics import metrics
+
+# Base URL of the upstream API; point it at razorpay_stub.py for local testing
+RAZORPAY_IFSC_URL = os.environ.get('RAZORPAY_IFSC_URL', 'https://ifsc.razorpay.com')
+
+UPSTREAM_TIMEOUT = float(os.environ.get('RAZORPAY_IFSC_TIMEOUT', 5))
+
+# Codes waiting for a background fetch, per process; more are dropped
+REFRESH_QUEUE_SIZE = int(os.environ.get('IFSC_REFRESH_QUEUE_SIZE', 1000))
+
+@metrics.timed('razorpay')
+def fetch_bank_details(ifsc_code):
+    """Fetch bank details from the upstream IFSC API.
+    
+    Returns None if the upstream does not know the code; raises on network
+    errors and other failed responses, so those are never cached as misses.
+    """
+    url = f"{RAZORPAY_IFSC_URL.rstrip('/')}/{ifsc_code.upper()}"
+    response = requests.get(url, timeout=UPSTREAM_TIMEOUT)
+    
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    
+    data = response.json()
+    return {
+        'IFSC': data.get('IFSC', ''),
+        'BANK': data.get('BANK', ''),
+        'BRANCH': data.get('BRANCH', ''),
+        'CITY1': data.get('DISTRICT', ''),
+        'CITY2': data.get('CITY', ''),
+        'STATE': data.get('STATE', ''),
+        'ADDRESS': data.get('ADDRESS', ''),
+        'PHONE': 'N/A',
+        'STD CODE': 'N/A',
+        'CONTACT': data.get('CONTACT', ''),
+        'RTGS': data.get('RTGS', False),
+        'SWIFT': data.get('SWIFT', ''),
+        'MICR': data.get('MICR', '')
+    }
+
+class UpstreamRefresher:
+    """Background thread fetching queued IFSC codes from the upstream into a cache.
+    
+    Queueing never blocks: a code already waiting is not queued twice, and
+    codes arriving while the queue is full are dropped, to be queued again on
+    their next view. The thread starts on first use in each process, so it
+    survives forking workers.
+    """
+    
+    def __init__(self, cache, fetch=fetch_bank_details, max_pending=REFRESH_QUEUE_SIZE):
+        self.cache = cache
+        self.fetch = fetch
+        self.max_pending = max_pending
+        self.counters = {'queued': 0, 'dropped': 0, 'fetched': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pending = set()
+        self._pid = None
+    
+    def _start(self):
+        """Start this process's worker thread, if not running yet; called with the lock held"""
+        if self._pid != os.getpid():
+            self._queue = queue.Queue(self.max_pending)
+            self._pending = set()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(self._queue,), name='ifsc-refresh', daemon=True).start()
+    
+    def enqueue(self, ifsc_code):
+        """Queue a code for a background fetch; returns whether it was queued"""
+        with self._lock:
+            self._start()
+            if ifsc_code in self._pending:
+                return False
+            try:
+                self._queue.put_nowait(ifsc_code)
+            except queue.Full:
+                self.counters['dropped'] += 1
+                return False
+            self._pending.add(ifsc_code)
+            self.counters['queued'] += 1
+            return True
+    
+    def _run(self, pending):
+        while True:
+            ifsc_code = pending.get()
+            try:
+                self.cache.set(ifsc_code, self.fetch(ifsc_code))
+                outcome = 'fetched'
+            except Exception as e:
+                logging.warning(f"Background refresh of {ifsc_code} failed: {e}")
+                outcome = 'failed'
+            with self._lock:
+                self.counters[outcome] += 1
+                self._pending.discard(ifsc_code)
+            pending.task_done()
+    
+    def join(self):
+        """Wait until every queued code has been fetched"""
+        if self._queue is not None:
+            self._queue.join()
@@ -0,0 +1,149 @@
+"""In-process metrics, exposed in the Prometheus text format.
+
+Metrics holds counters, gauges and latency histograms keyed by name and
+labels, and the module-level registry is shared by the app and the data
+layer. Stage timers split a request's time into stages such as dataset
+filtering, record conversion and template rendering: a stage nested in
+another is subtracted from it, so each stage reports only its own time.
+Values that already live elsewhere, like cache counters and the dataset
+version, are read by collectors when the metrics are rendered.
+
+Recording takes a few perf_counter() calls and one lock, cheap enough to
+leave on under load. Metrics are per process: under gunicorn each worker
+counts its own requests, and each scrape reads whichever worker answers it.
+"""
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(labels):
+    """Format (name, value) label pairs as {name="value",...}, escaped"""
+    if not labels:
+        return ''
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+def format_value(value):
+    if isinstance(value, float) and value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metrics:
+    """Counters, gauges and histograms of this process, with stage timers"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._described = {}
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    
+    def describe(self, name, kind, help_text):
+        """Declare a metric's kind (counter, gauge or histogram) and help text"""
+        self._described[name] = (kind, help_text)
+    
+    def inc(self, name, labels=(), amount=1):
+        """Add amount to a counter or gauge"""
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def observe(self, name, labels, seconds):
+        """Record one observation in a histogram"""
+        key = (name, labels)
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, the last one past every bound, then the sum
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[slot] += 1
+            histogram[-1] += seconds
+    
+    def add_collector(self, collect):
+        """Register collect() -> [(name, kind, help text, [(labels, value)])], called on every render"""
+        self._collectors.append(collect)
+    
+    def start_stage(self):
+        """Start timing a stage in this thread; returns the token end_stage() takes"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        # Each entry is [start, time spent in nested stages]
+        frame = [time.perf_counter(), 0.0]
+        stack.append(frame)
+        return frame
+    
+    def end_stage(self, frame, stage):
+        """Stop timing a stage, recording its time less that of the stages nested in it"""
+        elapsed = time.perf_counter() - frame[0]
+        stack = self._local.stack
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        self.observe('app_stage_duration_seconds', (('stage', stage),), elapsed - frame[1])
+    
+    def timed(self, stage):
+        """Decorate a function so each call is timed as stage"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                frame = self.start_stage()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.end_stage(frame, stage)
+            return wrapper
+        return decorate
+    
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: list(histogram) for key, histogram in self._histograms.items()}
+        
+        families = {}
+        for (name, labels), value in values.items():
+            families.setdefault(name, []).append((labels, value))
+        for collect in self._collectors:
+            for name, kind, help_text, samples in collect():
+                self._described.setdefault(name, (kind, help_text))
+                families.setdefault(name, []).extend(samples)
+        for name, _ in histograms:
+            families.setdefault(name, [])
+        
+        lines = []
+        for name in sorted(families):
+            kind, help_text = self._described.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(families[name], key=lambda sample: sample[0]):
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+            for (hist_name, labels), histogram in sorted(histograms.items()):
+                if hist_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram):
+                    cumulative += count
+                    bucket_labels = labels + (('le', format_value(float(bound))),)
+                    lines.append(f"{name}_bucket{format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram[-1])}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+# The registry of this process
+metrics = Metrics()
+metrics.describe('http_requests_total', 'counter', "Requests handled, by endpoint, method and status")
+metrics.describe('http_requests_in_flight', 'gauge', "Requests being handled, by endpoint")
+metrics.describe('http_request_duration_seconds', 'histogram', "Request latency in seconds, by endpoint")
+metrics.describe('app_stage_duration_seconds', 'histogram',
+                 "Time spent in each stage of handling requests, excluding nested stages")
@@ -0,0 +1,68 @@
+"""JSON payloads serialized once per dataset version.
+
+Endpoints whose response depends only on the loaded dataset keep their body
+as ready-made bytes, plain and gzipped, under a strong ETag derived from the
+dataset version. Repeat requests copy bytes out instead of recomputing and
+re-serializing, and conditional requests are answered with 304.
+"""
+import gzip
+import json
+import os
+import threading
+
+# Seconds clients and proxies may reuse a payload before revalidating
+PAYLOAD_MAX_AGE = int(os.environ.get('PAYLOAD_MAX_AGE', 3600))
+
+class Payload:
+    """One serialized JSON value with its gzipped variant and ETag"""
+    
+    def __init__(self, value, etag):
+        self.body = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        self.gzipped = gzip.compress(self.body, mtime=0)
+        self.etag = etag
+    
+    def respond(self, request, response_class, max_age=PAYLOAD_MAX_AGE):
+        """Build the response to request, gzipped if accepted and 304 if the client's copy is current"""
+        gzipped = 'gzip' in request.accept_encodings
+        response = response_class(self.gzipped if gzipped else self.body, mimetype='application/json')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        # The encodings are different bytes, so each gets its own strong ETag
+        response.set_etag(f"{self.etag}-gzip" if gzipped else self.etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return response.make_conditional(request)
+
+class PayloadCache:
+    """Payloads by name for the current dataset version; a new version drops the old ones"""
+    
+    def __init__(self):
+        self._version = None
+        self._payloads = {}
+        self.counters = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+    
+    def get(self, version, name, build):
+        """Get the payload name of a dataset version, serializing build() on first use"""
+        with self._lock:
+            if version == self._version and name in self._payloads:
+                self.counters['hits'] += 1
+                return self._payloads[name]
+            self.counters['misses'] += 1
+        
+        payload = Payload(build(), f"{name}-{version}")
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._payloads = {}
+            self._payloads[name] = payload
+        return payload
+    
+    def stats(self):
+        """Get this process's hit/miss counters and hit ratio"""
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
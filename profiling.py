@@ -0,0 +1,159 @@
+"""Profiles of single live requests, written to a local directory.
+
+A request is profiled when an admin asks for it, with the X-Profile header
+or the profile query flag next to a valid X-Admin-Token, or when it is
+picked at random at PROFILE_SAMPLE_RATE. The value of the header or flag
+may name the output format:
+
+- collapsed: a background thread samples the request thread's stack every
+  PROFILE_INTERVAL seconds and counts identical stacks, one "a;b;c count"
+  line per stack, ready for flamegraph.pl or speedscope. Python threads
+  only switch every sys.getswitchinterval() seconds, so a thread busy in
+  Python code is sampled at most that often.
+- pstats: cProfile traces every call of the request; read the file with
+  python -m pstats, snakeviz or gprof2dot.
+
+At most one request per process is profiled at a time, and the directory
+keeps the newest PROFILE_MAX_FILES profiles. Admins can profile a request
+on a running gunicorn at any time, without a restart; the settings below are
+read from the environment at start.
+    
+    curl -H "X-Admin-Token: $ADMIN_TOKEN" -H "X-Profile: collapsed" "$HOST/search?q=pune"
+    flamegraph.pl profiles/*-search-*.collapsed > search.svg
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+# Directory profiles are written to
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+# Share of all requests profiled without being asked for; 0 disables sampling
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Output format used when a request does not name one
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'collapsed')
+
+# Seconds between stack samples of collapsed profiles
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.001))
+
+# Profiles kept in the directory; older ones are deleted
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 500))
+
+def frame_label(code):
+    """Label a code object as function (file:line) in collapsed stacks"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Samples one thread's stack on a background thread, counting each distinct stack"""
+    
+    extension = 'collapsed'
+    
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+    
+    def _run(self):
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                if code not in labels:
+                    labels[code] = frame_label(code)
+                stack.append(labels[code])
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+    
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+class TracingProfile:
+    """cProfile of every call made by the current thread"""
+    
+    extension = 'pstats'
+    
+    def __init__(self):
+        self.profile = cProfile.Profile()
+    
+    def start(self):
+        self.profile.enable()
+    
+    def stop(self):
+        self.profile.disable()
+    
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+PROFILE_FORMATS = {'collapsed': StackSampler, 'pstats': TracingProfile}
+
+class RequestProfiler:
+    """Starts and writes the profiles of requests, one at a time per process"""
+    
+    def __init__(self, directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE, default_format=PROFILE_FORMAT,
+                 max_files=PROFILE_MAX_FILES):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.default_format = default_format if default_format in PROFILE_FORMATS else 'collapsed'
+        self.max_files = max_files
+        self._busy = threading.Lock()
+        self._count = 0
+    
+    def sampled(self):
+        """Decide whether to profile a request nobody asked to profile"""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+    
+    def start(self, name, output_format=None):
+        """Start profiling the current request; returns (profile, path), or None if one is running"""
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = PROFILE_FORMATS.get(output_format, PROFILE_FORMATS[self.default_format])()
+        try:
+            profile.start()
+        except ValueError as e:
+            # Another profiler already traces this thread
+            logging.warning(f"Not profiling {name}: {e}")
+            self._busy.release()
+            return None
+        self._count += 1
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{name}-{os.getpid()}-{self._count}.{profile.extension}"
+        return profile, os.path.join(self.directory, filename)
+    
+    def finish(self, started):
+        """Stop a profile returned by start() and write it out"""
+        profile, path = started
+        try:
+            profile.stop()
+            os.makedirs(self.directory, exist_ok=True)
+            profile.write(path)
+            self._trim()
+        except OSError as e:
+            logging.error(f"Error writing profile {path}: {e}")
+        finally:
+            self._busy.release()
+    
+    def _trim(self):
+        """Delete the oldest profiles beyond max_files; file names start with their time"""
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.rsplit('.', 1)[-1] in ('collapsed', 'pstats'))
+        for name in names[:max(len(names) - self.max_files, 0)]:
+            os.remove(os.path.join(self.directory, name))
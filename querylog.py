@@ -0,0 +1,85 @@
+"""Opt-in log of the requests the app serves, anonymized for replay.
+
+Set QUERY_LOG_PATH to append one JSON line per request: the endpoint, the
+path, the search parameters, the number of codes of a batch lookup, the
+status and the latency. Nothing identifies the client: addresses, headers,
+cookies and cursors are never logged, timestamps are whole seconds, and
+standalone runs of PHONE_DIGITS or more digits in parameters are replaced
+by zeros of the same length, so a phone search keeps its shape but not the
+number. IFSC codes, bank and place names are public data and kept as they
+are. Every worker appends to the same file.
+
+replay.py drives a logged query mix against the app.
+"""
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+# File the query log is appended to; unset disables logging
+QUERY_LOG_PATH = os.environ.get('QUERY_LOG_PATH', '')
+
+# Share of requests logged
+QUERY_LOG_SAMPLE_RATE = float(os.environ.get('QUERY_LOG_SAMPLE_RATE', 1))
+
+# Query parameters kept in the log; the rest are dropped
+LOGGED_PARAMS = ['q', 'type', 'bank', 'city', 'state', 'branch', 'limit']
+
+# Endpoints left out of the log
+UNLOGGED_ENDPOINTS = {'static', 'prometheus_metrics', 'admin_reload'}
+
+# Digit runs at least this long are masked as possible phone numbers
+PHONE_DIGITS = 6
+PHONE_RE = re.compile(rf'(?<![0-9A-Za-z])[0-9]{{{PHONE_DIGITS},}}(?![0-9A-Za-z])')
+
+def anonymize(value):
+    """Mask standalone runs of PHONE_DIGITS or more digits in value"""
+    return PHONE_RE.sub(lambda match: '0' * len(match.group()), value)
+
+class QueryLog:
+    """Appends anonymized request entries to a JSON lines file"""
+    
+    def __init__(self, path=QUERY_LOG_PATH, sample_rate=QUERY_LOG_SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._file = None
+        self._lock = threading.Lock()
+    
+    @property
+    def enabled(self):
+        return bool(self.path)
+    
+    def entry(self, endpoint, request, status, seconds, items=None):
+        """Build the log entry of one request"""
+        entry = {
+            't': int(time.time()),
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': anonymize(request.path),
+            'params': {name: anonymize(request.args[name]) for name in LOGGED_PARAMS if name in request.args},
+            'status': status,
+            'ms': round(seconds * 1000, 3),
+        }
+        if items is not None:
+            entry['items'] = items
+        return entry
+    
+    def record(self, endpoint, request, status, seconds, items=None):
+        """Log one request, if logging is enabled and the request is sampled"""
+        if not self.path or endpoint in UNLOGGED_ENDPOINTS:
+            return
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        line = json.dumps(self.entry(endpoint, request, status, seconds, items), separators=(',', ':')) + '\n'
+        with self._lock:
+            try:
+                # Reopened after fork, so workers do not share a buffer
+                if self._file is None or self._file[0] != os.getpid():
+                    self._file = (os.getpid(), open(self.path, 'a', encoding='utf-8', buffering=1))
+                self._file[1].write(line)
+            except OSError as e:
+                logging.error(f"Error writing query log {self.path}: {e}")
+                self.path = ''
@@ -0,0 +1,80 @@
+"""Local stand-in for the Razorpay IFSC API, for development and load tests.
+
+Answers GET /<IFSC> from the local dataset in Razorpay's response format and
+returns 404 for unknown codes. Run it and point the app at it with:
+
+    python razorpay_stub.py --port 8765 [--delay 0.2]
+    RAZORPAY_IFSC_URL=http://127.0.0.1:8765 python main.py
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from data_loader import BankDataLoader
+
+def razorpay_record(record):
+    """Convert a dataset record to the Razorpay response format"""
+    return {
+        'BANK': record['BANK'],
+        'IFSC': record['IFSC'],
+        'BRANCH': record['BRANCH'],
+        'ADDRESS': record['ADDRESS'],
+        'CONTACT': record['PHONE'],
+        'CITY': record['CITY2'],
+        'DISTRICT': record['CITY1'],
+        'STATE': record['STATE'],
+        'CENTRE': record['CITY1'],
+        'RTGS': True,
+        'NEFT': True,
+        'IMPS': True,
+        'UPI': True,
+        'MICR': '',
+        'SWIFT': '',
+        'BANKCODE': record['IFSC'][:4],
+    }
+
+class StubHandler(BaseHTTPRequestHandler):
+    loader = None
+    delay = 0.0
+    
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        record = self.loader.get_by_ifsc(self.path.strip('/'))
+        if record is None:
+            status, body = 404, b'"Not Found"'
+        else:
+            status, body = 200, json.dumps(razorpay_record(record)).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Razorpay IFSC API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to wait before every response")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    StubHandler.loader = BankDataLoader()
+    StubHandler.loader.load_data()
+    StubHandler.delay = args.delay
+    
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    logging.info(f"Razorpay stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
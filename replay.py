@@ -0,0 +1,236 @@
+"""Replay a logged query mix against the app and report throughput and latency.
+
+Reads a query log written with QUERY_LOG_PATH (see querylog.py) and sends its
+requests from --concurrency threads, each sending the next logged request as
+soon as its previous one is answered, so the app runs at full load. The log
+is sent once, or repeated until --requests have been sent or --duration
+seconds have passed. Redirects are not followed. The report gives requests
+per second and p50, p95 and p99 latency per endpoint and overall.
+
+Razorpay lookups must not leave the machine: --stub-port serves
+razorpay_stub.py from this process for the app to point at. To measure what
+one worker handles, serve the app with a single worker:
+    
+    RAZORPAY_IFSC_URL=http://127.0.0.1:8765 gunicorn -w 1 -b 127.0.0.1:5000 app:app
+    python replay.py queries.log --url http://127.0.0.1:5000 --stub-port 8765 --concurrency 8 --duration 60
+
+Or run the app inside this process, with the stub wired in (threads share
+one interpreter here, so this measures less than a worker process):
+    
+    python replay.py queries.log --in-process --concurrency 4
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+# Seconds to wait for one response before counting it as an error
+REPLAY_TIMEOUT = 30
+
+# Responses counted as errors; 4xx answers are part of a real mix
+ERROR_STATUS = 500
+
+IFSC_RE = re.compile(r'^[A-Za-z]{4}0[A-Za-z0-9]{6}$')
+
+def read_log(path):
+    """Read the entries of a query log, skipping lines that are not JSON"""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+def logged_codes(entries):
+    """Get the IFSC codes seen in the log, to fill the bodies of batch lookups whose codes were not logged"""
+    codes = []
+    for entry in entries:
+        for value in [entry['path'].rsplit('/', 1)[-1], entry.get('params', {}).get('q', '')]:
+            if IFSC_RE.match(value) and value.upper() not in codes:
+                codes.append(value.upper())
+    return codes or ['SBIN0000001']
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[max(math.ceil(len(ordered) * percent / 100) - 1, 0)]
+
+class HTTPTarget:
+    """Sends requests to a running app over HTTP, one session per thread"""
+    
+    def __init__(self, url, timeout=REPLAY_TIMEOUT):
+        import requests
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self._requests = requests
+        self._local = threading.local()
+    
+    def send(self, method, path, params, body):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, self.url + path, params=params, json=body,
+                                   allow_redirects=False, timeout=self.timeout)
+        # Read the whole body, as a client would
+        response.content
+        return response.status_code
+
+class InProcessTarget:
+    """Sends requests to the app imported into this process, one test client per thread"""
+    
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+    
+    def send(self, method, path, params, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, query_string=params, json=body)
+        response.get_data()
+        # Closing finishes the request's metrics and query log entry
+        response.close()
+        return response.status_code
+
+def start_stub(port):
+    """Serve razorpay_stub on port (0 for any free one) in a daemon thread; set its loader before sending requests"""
+    from razorpay_stub import StubHandler
+    
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Razorpay stub listening on http://127.0.0.1:{server.server_address[1]}")
+    return server
+
+def replay(target, entries, concurrency, requests=None, duration=None):
+    """Send entries from concurrency threads; returns (elapsed seconds, {endpoint: (latencies, errors)})"""
+    codes = logged_codes(entries)
+    total = requests if requests is not None else None if duration else len(entries)
+    deadline = None
+    counter = itertools.count()
+    results = []
+    failures = []
+    
+    def work():
+        latencies = {}
+        errors = {}
+        while True:
+            number = next(counter)
+            if (total is not None and number >= total) or (deadline is not None and time.perf_counter() > deadline):
+                break
+            entry = entries[number % len(entries)]
+            body = None
+            if 'items' in entry:
+                body = [codes[(number + slot) % len(codes)] for slot in range(entry['items'])]
+            endpoint = entry['endpoint']
+            started = time.perf_counter()
+            try:
+                failed = target.send(entry['method'], entry['path'], entry.get('params', {}), body) >= ERROR_STATUS
+            except Exception as e:
+                failures.append(f"{entry['method']} {entry['path']}: {e}")
+                failed = True
+            latencies.setdefault(endpoint, []).append(time.perf_counter() - started)
+            if failed:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+        results.append((latencies, errors))
+    
+    started = time.perf_counter()
+    if duration:
+        deadline = started + duration
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        logging.warning(f"{len(failures)} requests failed to complete, first: {failures[0]}")
+    
+    merged = {}
+    for latencies, errors in results:
+        for endpoint, times in latencies.items():
+            entry = merged.setdefault(endpoint, ([], 0))
+            merged[endpoint] = (entry[0] + times, entry[1] + errors.get(endpoint, 0))
+    return elapsed, merged
+
+def summarize(elapsed, merged):
+    """Get the report rows: requests, errors, requests per second and latency percentiles in ms"""
+    rows = dict(merged)
+    rows['all'] = ([seconds for times, _ in merged.values() for seconds in times],
+                   sum(errors for _, errors in merged.values()))
+    
+    report = {}
+    for endpoint, (times, errors) in rows.items():
+        if not times:
+            continue
+        ordered = sorted(times)
+        report[endpoint] = {
+            'requests': len(times),
+            'errors': errors,
+            'rps': round(len(times) / elapsed, 2),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a logged query mix against the app")
+    parser.add_argument('log', help="query log written with QUERY_LOG_PATH")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help="base URL of a running app")
+    target.add_argument('--in-process', action='store_true', help="import the app into this process and replay against it")
+    parser.add_argument('--concurrency', type=int, default=4, help="requests in flight at once")
+    parser.add_argument('--requests', type=int, help="requests to send, repeating the log as needed")
+    parser.add_argument('--duration', type=float, help="seconds to keep sending, repeating the log as needed")
+    parser.add_argument('--warmup', type=int, default=0, help="requests sent before measuring")
+    parser.add_argument('--stub-port', type=int, help="serve the Razorpay stub on this port for --url apps")
+    parser.add_argument('--json', help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    entries = read_log(args.log)
+    if not entries:
+        logging.error(f"No requests in {args.log}")
+        return 1
+    
+    if args.in_process:
+        # The app reads RAZORPAY_IFSC_URL on import, and the stub answers from the app's dataset
+        stub = start_stub(args.stub_port or 0)
+        os.environ['RAZORPAY_IFSC_URL'] = f"http://127.0.0.1:{stub.server_address[1]}"
+        import app
+        logging.getLogger().setLevel(logging.WARNING)
+        stub.RequestHandlerClass.loader = app.init_data()
+        runner = InProcessTarget(app.app)
+    else:
+        if args.stub_port:
+            from data_loader import BankDataLoader
+            stub = start_stub(args.stub_port)
+            stub.RequestHandlerClass.loader = BankDataLoader()
+            stub.RequestHandlerClass.loader.load_data()
+        runner = HTTPTarget(args.url)
+    
+    if args.warmup:
+        replay(runner, entries, args.concurrency, requests=args.warmup)
+    elapsed, merged = replay(runner, entries, args.concurrency, args.requests, args.duration)
+    report = summarize(elapsed, merged)
+    
+    print(f"{len(entries)} logged requests replayed at concurrency {args.concurrency} for {elapsed:.1f}s")
+    print(f"{'endpoint':<24} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in sorted(report.items(), key=lambda item: (item[0] == 'all', -item[1]['requests'])):
+        print(f"{endpoint:<24} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+              f"{row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'seconds': round(elapsed, 3), 'endpoints': report}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
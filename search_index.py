@@ -0,0 +1,690 @@
+import bisect
+import re
+import zlib
+import numpy as np
+from columnar import PackedStringColumn
+
+# Upper bound for every string that starts with a given prefix
+PREFIX_END = '\U0010ffff'
+
+WORD_RE = re.compile(r'\w+')
+
+# Values are encoded in blocks so one very long string only widens its own block
+ENCODE_BLOCK = 8192
+
+# Alphanumeric codes of up to this many characters pack into one int64 key
+CODE_KEY_WIDTH = 12
+
+# Digit of each ASCII character in a packed code key: 1-10 for 0-9, 11-36 for
+# letters of either case, -1 for anything that cannot appear in a code
+CODE_DIGITS = np.full(128, -1, dtype=np.int64)
+CODE_DIGITS[ord('0'):ord('9') + 1] = np.arange(1, 11)
+CODE_DIGITS[ord('A'):ord('Z') + 1] = np.arange(11, 37)
+CODE_DIGITS[ord('a'):ord('z') + 1] = np.arange(11, 37)
+
+def code_keys(codes):
+    """Pack alphanumeric codes into int64 keys, base 37, ignoring case.
+    
+    Codes that are empty, longer than CODE_KEY_WIDTH or hold any other
+    character get the key -1.
+    """
+    codes = np.asarray(codes, dtype=str)
+    if codes.dtype.itemsize == 0:
+        return np.full(len(codes), -1, dtype=np.int64)
+    width = codes.dtype.itemsize // 4
+    points = codes.view(np.uint32).reshape(len(codes), width)
+    lengths = np.char.str_len(codes)
+    
+    valid = (lengths > 0) & (lengths <= CODE_KEY_WIDTH)
+    keys = np.zeros(len(codes), dtype=np.int64)
+    for i in range(CODE_KEY_WIDTH):
+        if i < width:
+            digits = CODE_DIGITS[np.minimum(points[:, i], 127)]
+            digits[points[:, i] > 127] = -1
+            digits = np.where(i < lengths, digits, 0)
+            valid &= digits >= 0
+        else:
+            digits = 0
+        keys = keys * 37 + digits
+    keys[~valid] = -1
+    return keys
+
+def trigram_key(gram):
+    """Pack a 3-character string into one integer, 21 bits per code point"""
+    return (ord(gram[0]) << 42) | (ord(gram[1]) << 21) | ord(gram[2])
+
+def trigram_keys(text):
+    """Get the packed keys of every trigram in text"""
+    return {trigram_key(text[i:i + 3]) for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    """Substring index over a sequence of distinct strings.
+    
+    Every value is casefolded and split into trigrams, each packed into an
+    int64 key. Posting lists of value ids are stored back to back in one
+    array, grouped by sorted key and sliced by offsets. A query intersects the
+    posting lists of its own trigrams, shortest first, and the surviving
+    candidates are verified with a plain substring check.
+    
+    The index keeps a reference to values rather than a copy, so values can be
+    a column's own table of distinct strings.
+    """
+    
+    def __init__(self, values):
+        self.values = values
+        folded = [value.casefold() for value in values]
+        self.keys, self.offsets, self.postings = self._build(folded)
+        # Values without a trigram of their own, checked directly by short queries
+        self.short_ids = np.array([value_id for value_id, value in enumerate(folded) if len(value) < 3],
+                                  dtype=np.int32)
+    
+    @classmethod
+    def from_arrays(cls, values, arrays):
+        """Rebuild an index over values from the arrays of to_arrays()"""
+        index = cls.__new__(cls)
+        index.values = values
+        index.keys = arrays['keys']
+        index.offsets = arrays['offsets']
+        index.postings = arrays['postings']
+        index.short_ids = arrays['short_ids']
+        return index
+    
+    def to_arrays(self):
+        return {'keys': self.keys, 'offsets': self.offsets,
+                'postings': self.postings, 'short_ids': self.short_ids}
+    
+    @staticmethod
+    def _build(values):
+        """Compute sorted trigram keys, posting offsets and value ids"""
+        key_blocks = []
+        id_blocks = []
+        for start in range(0, len(values), ENCODE_BLOCK):
+            block = np.array(values[start:start + ENCODE_BLOCK], dtype=str)
+            width = block.dtype.itemsize // 4
+            if width < 3:
+                continue
+            # One row of code points per value, one column per trigram start
+            points = block.view(np.uint32).reshape(len(block), width).astype(np.int64)
+            keys = (points[:, :-2] << 42) | (points[:, 1:-1] << 21) | points[:, 2:]
+            valid = np.arange(width - 2) < (np.strings.str_len(block) - 2)[:, None]
+            ids = np.arange(start, start + len(block), dtype=np.int32)
+            key_blocks.append(keys[valid])
+            id_blocks.append(np.broadcast_to(ids[:, None], keys.shape)[valid])
+        
+        if not key_blocks:
+            return np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        
+        keys = np.concatenate(key_blocks)
+        ids = np.concatenate(id_blocks)
+        
+        # Ids are ascending in input order, so a stable sort by key leaves
+        # each posting list sorted; then drop repeats of a trigram in a value
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        ids = ids[order]
+        keep = np.ones(len(keys), dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (ids[1:] != ids[:-1])
+        keys = keys[keep]
+        ids = ids[keep]
+        
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        offsets = np.append(starts, len(keys)).astype(np.int64)
+        return keys[starts], offsets, ids
+    
+    @classmethod
+    def _merged(cls, keys, offsets, postings, id_remap, new_ids, folded, size):
+        """Remap posting lists by id_remap and merge in those of the folded values with ids new_ids.
+        
+        size bounds the new ids. Returns keys, offsets and postings like _build().
+        """
+        new_keys, new_offsets, new_postings = cls._build(folded)
+        
+        # Order (key, id) pairs by one int64: rank of the key among all keys, then id
+        all_keys = np.union1d(keys, new_keys)
+        size = max(size, 1)
+        old_ids = id_remap[postings]
+        alive = old_ids >= 0
+        old_pairs = np.repeat(np.searchsorted(all_keys, keys), np.diff(offsets))[alive] * size + old_ids[alive]
+        if np.any(np.diff(id_remap[id_remap >= 0]) < 0):
+            # Surviving ids changed order, so their posting lists need sorting again
+            old_pairs = np.sort(old_pairs)
+        new_pairs = np.repeat(np.searchsorted(all_keys, new_keys), np.diff(new_offsets)) * size + new_ids[new_postings]
+        pairs = np.insert(old_pairs, np.searchsorted(old_pairs, new_pairs), new_pairs)
+        
+        ranks = pairs // size
+        starts = np.flatnonzero(np.r_[True, ranks[1:] != ranks[:-1]]) if len(pairs) else np.zeros(0, dtype=np.int64)
+        return all_keys[ranks[starts]], np.append(starts, len(pairs)).astype(np.int64), (pairs % size).astype(np.int32)
+    
+    def updated(self, values, id_remap, new_ids):
+        """Get the index of values, an updated version of this index's values.
+        
+        id_remap gives the new id of every old value id, -1 for values gone
+        or changed; new_ids are the sorted ids of the values to index afresh.
+        Only those are split into trigrams: surviving posting lists are
+        remapped and the new postings merged into them.
+        """
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+        folded = [values[value_id].casefold() for value_id in new_ids.tolist()]
+        index = TrigramIndex.__new__(TrigramIndex)
+        index.values = values
+        index.keys, index.offsets, index.postings = self._merged(
+            self.keys, self.offsets, self.postings, id_remap, new_ids, folded, len(values))
+        
+        short_ids = id_remap[self.short_ids]
+        index.short_ids = np.union1d(short_ids[short_ids >= 0],
+                                     new_ids[[len(value) < 3 for value in folded]]).astype(np.int32)
+        return index
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def posting_list(self, key):
+        """Get the sorted ids of values containing a packed trigram key"""
+        slot = np.searchsorted(self.keys, key)
+        if slot == len(self.keys) or self.keys[slot] != key:
+            return self.postings[:0]
+        return self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+    
+    def _search_short(self, query, lo, hi):
+        """Get the ids in [lo, hi) of values containing a query of fewer than 3 characters.
+        
+        Any value with a trigram containing the query contains the query, so
+        the answer is the union of those posting lists plus the matching
+        values too short to have a trigram. No verification is needed.
+        """
+        hi = len(self.values) if hi is None else min(hi, len(self.values))
+        hits = np.zeros(max(hi - lo, 0), dtype=bool)
+        if query:
+            first = self.keys >> 42
+            second = (self.keys >> 21) & 0x1FFFFF
+            third = self.keys & 0x1FFFFF
+            points = [ord(char) for char in query]
+            if len(points) == 1:
+                gram_mask = (first == points[0]) | (second == points[0]) | (third == points[0])
+            else:
+                gram_mask = (((first == points[0]) & (second == points[1])) |
+                             ((second == points[0]) & (third == points[1])))
+            for slot in np.flatnonzero(gram_mask).tolist():
+                posting_list = self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+                if lo or hi < len(self.values):
+                    posting_list = posting_list[np.searchsorted(posting_list, lo):np.searchsorted(posting_list, hi)]
+                hits[posting_list - lo] = True
+        else:
+            hits[:] = True
+        
+        values = self.values
+        for value_id in self.short_ids.tolist():
+            if lo <= value_id < hi and query in values[value_id].casefold():
+                hits[value_id - lo] = True
+        return (np.flatnonzero(hits) + lo).astype(np.int32)
+    
+    def search(self, query, lo=0, hi=None):
+        """Get the ids of all values containing query, case-insensitively.
+        
+        With lo and hi, only ids in [lo, hi) are returned, and only candidates
+        in that range are verified.
+        """
+        query = query.casefold()
+        if len(query) < 3:
+            return self._search_short(query, lo, hi)
+        
+        lists = sorted((self.posting_list(key) for key in trigram_keys(query)), key=len)
+        candidates = lists[0]
+        for posting_list in lists[1:]:
+            if len(candidates) == 0:
+                break
+            candidates = np.intersect1d(candidates, posting_list, assume_unique=True)
+        
+        if lo or hi is not None:
+            candidates = candidates[np.searchsorted(candidates, lo):
+                                    len(candidates) if hi is None else np.searchsorted(candidates, hi)]
+        
+        values = self.values
+        matches = [value_id for value_id in candidates.tolist() if query in values[value_id].casefold()]
+        return np.array(matches, dtype=np.int32)
+
+class PrefixIndex:
+    """Completion index over a sequence of distinct strings.
+    
+    There is one entry per word start in every value, sorted by the casefolded
+    text from that word onwards, so two bisects bound all values having a word
+    that begins with the query. Entries are (value id, offset) pairs into the
+    values sequence; the suffix strings themselves are never stored.
+    """
+    
+    def __init__(self, values):
+        self.values = values
+        
+        folded = [value.casefold() for value in values]
+        entries = [(value_id, match.start())
+                   for value_id, value in enumerate(folded)
+                   for match in WORD_RE.finditer(value)]
+        entries.sort(key=lambda entry: folded[entry[0]][entry[1]:])
+        self.ids = np.array([value_id for value_id, _ in entries], dtype=np.int32)
+        self.offsets = np.array([offset for _, offset in entries], dtype=np.int32)
+    
+    @classmethod
+    def from_arrays(cls, values, arrays):
+        """Rebuild an index over values from the arrays of to_arrays()"""
+        index = cls.__new__(cls)
+        index.values = values
+        index.ids = arrays['ids']
+        index.offsets = arrays['offsets']
+        return index
+    
+    def to_arrays(self):
+        return {'ids': self.ids, 'offsets': self.offsets}
+    
+    def updated(self, values, id_remap, new_ids):
+        """Get the index of values, an updated version of this index's values.
+        
+        Takes id_remap and new_ids like TrigramIndex.updated(). Entries are
+        ordered by suffix, then value id and offset, as a fresh build orders
+        them. Entries of new values are sorted on their own and bisected into
+        place; surviving entries keep their order unless their ids changed
+        order.
+        """
+        ids = id_remap[self.ids]
+        alive = ids >= 0
+        index = PrefixIndex.__new__(PrefixIndex)
+        index.values = values
+        index.ids = ids[alive].astype(np.int32)
+        index.offsets = self.offsets[alive]
+        entry_key = lambda entry: (index._suffix(entry), int(index.ids[entry]), int(index.offsets[entry]))
+        if np.any(np.diff(id_remap[id_remap >= 0]) < 0):
+            order = sorted(range(len(index.ids)), key=entry_key)
+            index.ids = index.ids[order]
+            index.offsets = index.offsets[order]
+        
+        folded = {value_id: values[value_id].casefold() for value_id in np.asarray(new_ids).tolist()}
+        entries = sorted((folded[value_id][match.start():], value_id, match.start())
+                         for value_id, value in folded.items()
+                         for match in WORD_RE.finditer(value))
+        existing = range(len(index.ids))
+        slots = [bisect.bisect_left(existing, entry, key=entry_key) for entry in entries]
+        index.ids = np.insert(index.ids, slots, [value_id for _, value_id, _ in entries]).astype(np.int32)
+        index.offsets = np.insert(index.offsets, slots, [offset for _, _, offset in entries]).astype(np.int32)
+        return index
+    
+    def __len__(self):
+        return len(self.values)
+    
+    def _suffix(self, entry):
+        return self.values[self.ids[entry]].casefold()[self.offsets[entry]:]
+    
+    def complete(self, query, limit, substring=None):
+        """Get up to limit values matching query, best matches first.
+        
+        Values starting with the query come first, then values with a later
+        word starting with it, each group in alphabetical order. With
+        substring, a function getting the sorted ids of all values containing
+        a query, such as a TrigramIndex search, remaining slots are filled with
+        those values.
+        """
+        query = query.casefold()
+        entries = range(len(self.ids))
+        lo = bisect.bisect_left(entries, query, key=self._suffix)
+        hi = bisect.bisect_left(entries, query + PREFIX_END, lo=lo, key=self._suffix)
+        
+        ids = self.ids[lo:hi]
+        whole_value = self.offsets[lo:hi] == 0
+        found = dict.fromkeys(ids[whole_value][:limit].tolist())
+        for value_id in ids[~whole_value].tolist():
+            if len(found) >= limit:
+                break
+            found.setdefault(value_id)
+        
+        if substring is not None and len(found) < limit:
+            for value_id in substring(query).tolist():
+                found.setdefault(value_id)
+                if len(found) >= limit:
+                    break
+        
+        return [self.values[value_id] for value_id in found]
+
+def edit_distance(a, b, limit):
+    """Get the Levenshtein distance between a and b, or limit + 1 if it is more than limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        current = [i]
+        for j, other in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+class FuzzyIndex:
+    """Index of the distinct words of a vocabulary, for finding the words within a
+    few edits of a misspelt one.
+    
+    Words are padded with two spaces on each side and indexed by trigram like
+    TrigramIndex. Each edit touches at most three of a word's padded
+    trigrams, so a word within k edits of the query shares all but 3k of the
+    query's trigrams. Candidates are counted over the query's posting lists
+    in one pass, filtered by that bound and by length, and only the few left
+    have their edit distance computed.
+    """
+    
+    def __init__(self, words):
+        self.words = words
+        self.lengths = np.array([len(word) for word in words], dtype=np.int32)
+        self.keys, self.offsets, self.postings = TrigramIndex._build([f"  {word}  " for word in words])
+    
+    @classmethod
+    def from_values(cls, values):
+        """Build an index of the sorted distinct casefolded words of values"""
+        return cls(sorted({word for value in values for word in WORD_RE.findall(value.casefold())}))
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from the arrays of to_arrays()"""
+        index = cls.__new__(cls)
+        index.words = PackedStringColumn(arrays['word_buffer'], arrays['word_offsets'])
+        index.lengths = arrays['lengths']
+        index.keys = arrays['keys']
+        index.offsets = arrays['offsets']
+        index.postings = arrays['postings']
+        return index
+    
+    def to_arrays(self):
+        words = self.words
+        if not isinstance(words, PackedStringColumn):
+            words = PackedStringColumn.from_values(words)
+        return {'word_buffer': words.buffer, 'word_offsets': words.offsets, 'lengths': self.lengths,
+                'keys': self.keys, 'offsets': self.offsets, 'postings': self.postings}
+    
+    def __len__(self):
+        return len(self.words)
+    
+    def updated(self, words, word_remap, new_ids):
+        """Get the index of words, an updated version of this index's words.
+        
+        Takes word_remap and new_ids like TrigramIndex.updated(), and like it
+        splits only the new words into trigrams.
+        """
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+        index = FuzzyIndex.__new__(FuzzyIndex)
+        index.words = words
+        index.lengths = np.zeros(len(words), dtype=np.int32)
+        alive = word_remap >= 0
+        index.lengths[word_remap[alive]] = self.lengths[alive]
+        index.lengths[new_ids] = [len(words[word_id]) for word_id in new_ids.tolist()]
+        index.keys, index.offsets, index.postings = TrigramIndex._merged(
+            self.keys, self.offsets, self.postings, word_remap, new_ids,
+            [f"  {words[word_id]}  " for word_id in new_ids.tolist()], len(words))
+        return index
+    
+    def matches(self, word, max_edits, limit=None):
+        """Get up to limit (word, distance) pairs of the indexed words within
+        max_edits of word, closest first.
+        """
+        word = word.casefold()
+        grams = np.array(sorted(trigram_keys(f"  {word}  ")), dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self.keys, grams), max(len(self.keys) - 1, 0))
+        slots = slots[self.keys[slots] == grams] if len(self.keys) else slots[:0]
+        if len(slots) == 0:
+            return []
+        
+        shared = np.bincount(np.concatenate([self.postings[self.offsets[slot]:self.offsets[slot + 1]]
+                                             for slot in slots.tolist()]), minlength=len(self.words))
+        candidates = np.flatnonzero((shared >= max(len(grams) - 3 * max_edits, 1)) &
+                                    (np.abs(self.lengths - len(word)) <= max_edits))
+        words = self.words
+        found = []
+        for word_id in candidates.tolist():
+            candidate = words[word_id]
+            distance = edit_distance(word, candidate, max_edits)
+            if distance <= max_edits:
+                found.append((distance, candidate))
+        found.sort()
+        return [(candidate, distance) for distance, candidate in found[:limit]]
+
+class HashIndex:
+    """Open-addressing hash table from string keys to row positions.
+    
+    The table is one int32 array of positions, -1 marking empty slots and -2
+    slots whose key was removed, which probes step over. Keys are not
+    stored: a probe recomputes the key of a candidate row with
+    key_at(position). Keys hash with CRC32, which unlike hash() is the same in
+    every process, so a table built once can be saved and memory-mapped by
+    every worker.
+    """
+    
+    EMPTY = -1
+    REMOVED = -2
+    
+    def __init__(self, table, key_at):
+        self.table = table
+        self.key_at = key_at
+        self.mask = len(table) - 1
+        self._positions = None
+    
+    @classmethod
+    def build(cls, keys, key_at):
+        """Index a list of keys by position.
+        
+        Empty keys are skipped and the first position of a repeated key wins.
+        Returns the index and a list of (first position, position) pairs for
+        every repeat.
+        """
+        size = 16
+        while size < 2 * len(keys):
+            size <<= 1
+        mask = size - 1
+        table = [-1] * size
+        repeats = []
+        for position, key in enumerate(keys):
+            if not key:
+                continue
+            slot = zlib.crc32(key.encode('utf-8')) & mask
+            while True:
+                owner = table[slot]
+                if owner == -1:
+                    table[slot] = position
+                    break
+                if keys[owner] == key:
+                    repeats.append((owner, position))
+                    break
+                slot = (slot + 1) & mask
+        return cls(np.array(table, dtype=np.int32), key_at), repeats
+    
+    @classmethod
+    def from_arrays(cls, arrays, key_at):
+        return cls(arrays['table'], key_at)
+    
+    def to_arrays(self):
+        return {'table': self.table}
+    
+    def _slot(self, key):
+        """Get the slot holding key, or None"""
+        table = self.table
+        slot = zlib.crc32(key.encode('utf-8')) & self.mask
+        while True:
+            position = int(table[slot])
+            if position == self.EMPTY:
+                return None
+            if position >= 0 and self.key_at(position) == key:
+                return slot
+            slot = (slot + 1) & self.mask
+    
+    def _insert(self, key, position):
+        """Point key at position, reusing the first removed slot on its probe path"""
+        table = self.table
+        slot = zlib.crc32(key.encode('utf-8')) & self.mask
+        free = None
+        while True:
+            owner = int(table[slot])
+            if owner == self.EMPTY:
+                table[slot if free is None else free] = position
+                return
+            if owner == self.REMOVED:
+                if free is None:
+                    free = slot
+            elif self.key_at(owner) == key:
+                table[slot] = position
+                return
+            slot = (slot + 1) & self.mask
+    
+    def updated(self, remap, changes, key_at):
+        """Get the index of an updated row table.
+        
+        remap gives the new position of every old row, -1 for dropped rows,
+        and key_at reads keys from the new table. changes maps every key
+        whose owning row was dropped, replaced or changed its key to its new
+        owner position, or None to remove it. Those keys are looked up in the
+        old table, then every other entry is remapped in place.
+        """
+        table = self.table.astype(np.int32)
+        for key in changes:
+            slot = self._slot(key)
+            if slot is not None:
+                table[slot] = self.REMOVED
+        occupied = table >= 0
+        moved = remap[table[occupied]]
+        table[occupied] = np.where(moved >= 0, moved, self.REMOVED)
+        
+        inserts = [(key, position) for key, position in changes.items() if position is not None]
+        if 2 * (np.count_nonzero(table != self.EMPTY) + len(inserts)) > len(table):
+            # Too full: rehash the live entries into a table sized for them
+            positions = np.sort(table[table >= 0]).tolist()
+            size = 16
+            while size < 2 * (len(positions) + len(inserts)):
+                size <<= 1
+            index = HashIndex(np.full(size, self.EMPTY, dtype=np.int32), key_at)
+            for position in positions:
+                index._insert(key_at(position), position)
+        else:
+            index = HashIndex(table, key_at)
+        for key, position in inserts:
+            index._insert(key, position)
+        return index
+    
+    def get(self, key):
+        """Get the position of the first row with this key, or None"""
+        if not key:
+            return None
+        slot = self._slot(key)
+        return None if slot is None else int(self.table[slot])
+    
+    def __contains__(self, key):
+        return self.get(key) is not None
+    
+    def __len__(self):
+        return len(self.positions())
+    
+    def positions(self):
+        """Get the sorted positions of the first row of every key"""
+        if self._positions is None:
+            self._positions = np.sort(self.table[self.table >= 0])
+        return self._positions
+
+class GroupIndex:
+    """Map from integer group keys to lists of row positions.
+    
+    Keys are kept sorted in one array and positions are stored back to back,
+    sliced by offsets, so a lookup is one binary search.
+    """
+    
+    def __init__(self, keys, offsets, positions):
+        self.keys = keys
+        self.offsets = offsets
+        self.positions = positions
+    
+    @classmethod
+    def build(cls, keys, positions):
+        """Group positions by key; positions keep their given order within a group"""
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int32)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+        offsets = np.append(starts, len(keys)).astype(np.int64)
+        return cls(keys[starts], offsets, positions[order])
+    
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['keys'], arrays['offsets'], arrays['positions'])
+    
+    def to_arrays(self):
+        return {'keys': self.keys, 'offsets': self.offsets, 'positions': self.positions}
+    
+    def __len__(self):
+        return len(self.keys)
+    
+    def updated(self, remap, keys=(), positions=(), key_remap=None):
+        """Get a copy with positions remapped, dropping those mapped to -1, and (key, position) pairs added.
+        
+        key_remap, if given, holds the new key of each of self.keys, -1
+        dropping its group. Positions must ascend within each group, as they
+        do in every index built from row order, and keys must not be negative.
+        Surviving groups are remapped, moved whole if their keys changed
+        order, and the added pairs merged into them the way
+        TrigramIndex.updated() merges posting lists.
+        """
+        group_keys = self.keys if key_remap is None else np.asarray(key_remap, dtype=np.int64)
+        keys = np.asarray(keys, dtype=np.int64)
+        positions = np.asarray(positions, dtype=np.int64)
+        
+        groups = np.flatnonzero(group_keys >= 0)
+        if np.any(np.diff(group_keys[groups]) < 0):
+            # Re-keyed groups changed order, so move them whole into key order
+            groups = groups[np.argsort(group_keys[groups])]
+        starts = self.offsets[groups]
+        lengths = self.offsets[groups + 1] - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        
+        # Order (key, position) pairs by one int64: rank of the key among all keys, then position
+        all_keys = np.sort(np.concatenate([group_keys[groups], keys]))
+        if len(all_keys):
+            all_keys = all_keys[np.r_[True, all_keys[1:] != all_keys[:-1]]]
+        old_positions = remap[self.positions[entries]]
+        alive = old_positions >= 0
+        old_positions = old_positions[alive]
+        size = max(int(old_positions.max(initial=-1)), int(positions.max(initial=-1))) + 1
+        old_pairs = np.repeat(np.searchsorted(all_keys, group_keys[groups]), lengths)[alive] * size + old_positions
+        new_pairs = np.sort(np.searchsorted(all_keys, keys) * size + positions)
+        pairs = np.insert(old_pairs, np.searchsorted(old_pairs, new_pairs), new_pairs)
+        
+        ranks = pairs // size
+        starts = np.flatnonzero(np.r_[True, ranks[1:] != ranks[:-1]]) if len(pairs) else np.zeros(0, dtype=np.int64)
+        return GroupIndex(all_keys[ranks[starts]], np.append(starts, len(pairs)).astype(np.int64),
+                          (pairs % size).astype(np.int32))
+    
+    def first_positions(self, keys):
+        """Get the first position of the group of each key, or -1 for unknown keys"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[slots] == keys
+        return np.where(found, self.positions[self.offsets[slots]].astype(np.int64), -1)
+    
+    def get(self, key):
+        """Get the positions in a group, empty if the key is unknown"""
+        slot = np.searchsorted(self.keys, key)
+        if slot == len(self.keys) or self.keys[slot] != key:
+            return self.positions[:0]
+        return self.positions[self.offsets[slot]:self.offsets[slot + 1]]
+    
+    def get_many(self, keys, limit=None):
+        """Get the positions in the groups of any of keys, sorted; keys must be
+        distinct, and unknown ones are skipped.
+        
+        With limit, only the first limit positions are returned, so only the
+        first limit of each group are gathered.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.keys) == 0 or len(keys) == 0:
+            return self.positions[:0]
+        slots = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        slots = slots[self.keys[slots] == keys]
+        starts = self.offsets[slots]
+        ends = self.offsets[slots + 1]
+        if limit is not None:
+            ends = np.minimum(ends, starts + limit)
+        lengths = ends - starts
+        entries = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.sort(self.positions[entries])[:limit]
@@ -0,0 +1,116 @@
+"""Sitemap generation for every IFSC and bank branch page.
+
+The sitemap is a sitemap index pointing at numbered child sitemaps of at most
+MAX_URLS URLs each, the limit of the sitemap protocol. Child sitemaps are
+generated as streams of XML chunks straight from the loader's indexes, so no
+sitemap is ever held in memory as one string. write_sitemaps() renders them
+gzipped to disk at data-build time, for serving as static files.
+"""
+import gzip
+import os
+
+SITEMAP_BASE_URL = os.environ.get('SITEMAP_BASE_URL', 'https://bankbranchfinder.com')
+
+# URLs per child sitemap, the sitemap protocol maximum
+MAX_URLS = 50000
+
+# URLs rendered into one streamed chunk
+CHUNK_URLS = 1000
+
+LASTMOD = '2024-01-01'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+def url_entry(loc, lastmod, changefreq, priority):
+    return f'''    <url>
+        <loc>{loc}</loc>
+        <lastmod>{lastmod}</lastmod>
+        <changefreq>{changefreq}</changefreq>
+        <priority>{priority}</priority>
+    </url>
+'''
+
+def iter_urlset(entries):
+    """Render (loc, lastmod, changefreq, priority) entries as a urlset, in chunks"""
+    yield XML_HEADER + '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    chunk = []
+    for entry in entries:
+        chunk.append(url_entry(*entry))
+        if len(chunk) >= CHUNK_URLS:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk) + '</urlset>'
+
+class SiteMap:
+    """Sitemap index and child sitemaps over one loaded dataset.
+    
+    URLs are numbered in a fixed order: the homepage, every IFSC page, then
+    every bank branch page. Child sitemap n (from 1) holds URLs
+    [(n - 1) * max_urls, n * max_urls), read from the matching slice of each
+    section without rendering the URLs before it.
+    """
+    
+    def __init__(self, loader, base_url=SITEMAP_BASE_URL, max_urls=MAX_URLS):
+        self.loader = loader
+        self.base_url = base_url.rstrip('/')
+        self.max_urls = max_urls
+        self.sections = [
+            (1, self._home_entries),
+            (loader.count_ifsc_codes(), self._ifsc_entries),
+            (loader.count_branch_slugs(), self._branch_entries),
+        ]
+    
+    def _home_entries(self, start, stop):
+        yield (f"{self.base_url}/", LASTMOD, 'daily', '1.0')
+    
+    def _ifsc_entries(self, start, stop):
+        for ifsc in self.loader.iter_ifsc_codes(start, stop):
+            yield (f"{self.base_url}/ifsc/{ifsc}", LASTMOD, 'monthly', '0.8')
+    
+    def _branch_entries(self, start, stop):
+        for bank_slug, city_slug, branch_slug in self.loader.iter_branch_slugs(start, stop):
+            yield (f"{self.base_url}/bank/{bank_slug}/{city_slug}/{branch_slug}", LASTMOD, 'monthly', '0.7')
+    
+    def url_count(self):
+        return sum(count for count, _ in self.sections)
+    
+    def shard_count(self):
+        return max(1, -(-self.url_count() // self.max_urls))
+    
+    def _entries(self, start, stop):
+        """Get the entries of URLs [start, stop) across sections"""
+        offset = 0
+        for count, entries in self.sections:
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, count)
+            if lo < hi:
+                yield from entries(lo, hi)
+            offset += count
+    
+    def iter_shard(self, number):
+        """Render child sitemap number (from 1) in chunks"""
+        start = (number - 1) * self.max_urls
+        return iter_urlset(self._entries(start, start + self.max_urls))
+    
+    def iter_index(self, shard_url):
+        """Render the sitemap index; shard_url(number) gives each child sitemap's URL"""
+        yield XML_HEADER + '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        for number in range(1, self.shard_count() + 1):
+            yield f'''    <sitemap>
+        <loc>{shard_url(number)}</loc>
+        <lastmod>{LASTMOD}</lastmod>
+    </sitemap>
+'''
+        yield '</sitemapindex>'
+
+def shard_filename(number):
+    return f"sitemap-{number}.xml.gz"
+
+def write_sitemaps(loader, directory):
+    """Write every child sitemap gzipped into directory; returns the number written"""
+    os.makedirs(directory, exist_ok=True)
+    site_map = SiteMap(loader)
+    for number in range(1, site_map.shard_count() + 1):
+        with gzip.open(os.path.join(directory, shard_filename(number)), 'wt', encoding='utf-8') as f:
+            f.writelines(site_map.iter_shard(number))
+    return site_map.shard_count()
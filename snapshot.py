@@ -0,0 +1,188 @@
+"""Binary snapshot of the cleaned bank dataset and its search indexes.
+
+A snapshot is a directory holding one arrays.bin file, with every column and
+index array stored back to back, a manifest.json describing where each array
+lives, and the gzipped child sitemaps of the dataset. Loading one skips CSV
+parsing, cleaning and index building. The arrays file is memory-mapped
+read-only, so pages are only read from disk when a request touches them, and
+every worker process mapping the same snapshot shares one copy of them in the
+page cache.
+
+Build one with:
+    
+    python snapshot.py [--output DIR]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import sitemap
+from columnar import ColumnStore
+
+# Bump when the layout of the arrays changes; older snapshots are then ignored
+FORMAT_VERSION = 2
+
+MANIFEST = 'manifest.json'
+ARRAYS = 'arrays.bin'
+
+# Subdirectory of prebuilt gzipped child sitemaps
+SITEMAPS = 'sitemaps'
+
+# Every array starts at a multiple of this many bytes in the arrays file
+ALIGNMENT = 64
+
+def dataset_version(sources):
+    """Get a short content hash identifying the source CSV files"""
+    digest = hashlib.sha1()
+    for path in sources:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+def read_manifest(directory):
+    """Get the manifest of a snapshot, or None if there is no usable one"""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format_version') != FORMAT_VERSION:
+        return None
+    return manifest
+
+def is_fresh(directory, sources):
+    """Check for a usable snapshot at least as new as every source file"""
+    if read_manifest(directory) is None:
+        return False
+    snapshot_mtime = os.path.getmtime(os.path.join(directory, MANIFEST))
+    return all(os.path.getmtime(path) <= snapshot_mtime
+               for path in sources if os.path.exists(path))
+
+def _write_arrays(path, groups):
+    """Write groups of named arrays back to back into one file and return their layout"""
+    layout = {}
+    offset = 0
+    with open(path, 'wb') as f:
+        for group, arrays in groups.items():
+            layout[group] = {}
+            for name, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                padding = -offset % ALIGNMENT
+                f.write(b'\0' * padding)
+                offset += padding
+                f.write(array.tobytes())
+                layout[group][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+                offset += array.nbytes
+    return layout
+
+def _read_arrays(path, layout, mmap):
+    """Get the groups of arrays written by _write_arrays as views of one buffer"""
+    if mmap:
+        data = np.asarray(np.memmap(path, dtype=np.uint8, mode='r'))
+    else:
+        data = np.fromfile(path, dtype=np.uint8)
+    groups = {}
+    for group, arrays in layout.items():
+        groups[group] = {}
+        for name, entry in arrays.items():
+            dtype = np.dtype(entry['dtype'])
+            size = int(np.prod(entry['shape'])) * dtype.itemsize
+            chunk = data[entry['offset']:entry['offset'] + size]
+            groups[group][name] = chunk.view(dtype).reshape(entry['shape'])
+    return groups
+
+def write_snapshot(directory, loader, version, deltas=()):
+    """Write the loader's column store and indexes as a snapshot.
+    
+    The snapshot is assembled in a temporary directory next to the target and
+    renamed into place, so readers never see a half-written snapshot. Workers
+    still mapping the old arrays file keep their mapping until they reload.
+    deltas lists the delta files applied since the snapshot was last built
+    from the CSV files, for the manifest.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    staging = os.path.join(parent, f".{os.path.basename(directory)}.tmp-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    
+    groups = {f"column.{name}": column.to_arrays() for name, column in loader.store.columns.items()}
+    groups.update(loader.index_arrays())
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'dataset_version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'rows': len(loader.store),
+        'columns': [{'name': name, 'kind': column.kind} for name, column in loader.store.columns.items()],
+        'arrays': _write_arrays(os.path.join(staging, ARRAYS), groups),
+        'sitemaps': sitemap.write_sitemaps(loader, os.path.join(staging, SITEMAPS)),
+        'sitemap_base_url': sitemap.SITEMAP_BASE_URL,
+        'deltas': list(deltas),
+    }
+    
+    # The manifest goes last: its mtime is the snapshot's build time
+    with open(os.path.join(staging, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    retired = None
+    if os.path.exists(directory):
+        retired = f"{staging}.old"
+        os.rename(directory, retired)
+    os.rename(staging, directory)
+    if retired:
+        shutil.rmtree(retired, ignore_errors=True)
+    return manifest
+
+def read_snapshot(directory, mmap=True):
+    """Read a snapshot.
+    
+    Returns (manifest, store, index_arrays), where index_arrays maps each
+    index name to the arrays it is rebuilt from.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise ValueError(f"No usable snapshot in {directory}")
+    
+    groups = _read_arrays(os.path.join(directory, ARRAYS), manifest['arrays'], mmap)
+    columns = {}
+    for entry in manifest['columns']:
+        arrays = groups.pop(f"column.{entry['name']}")
+        columns[entry['name']] = ColumnStore.column_types[entry['kind']].from_arrays(arrays)
+    return manifest, ColumnStore(columns), groups
+
+def build(directory=None):
+    """Build a snapshot from the CSV files, or return None if any is missing"""
+    from data_loader import CSV_FILES, SNAPSHOT_DIR, BankDataLoader
+    
+    directory = directory or SNAPSHOT_DIR
+    missing = [path for path in CSV_FILES if not os.path.exists(path)]
+    if missing:
+        logging.warning(f"Not building a snapshot, missing source files: {', '.join(missing)}")
+        return None
+    
+    started = time.time()
+    loader = BankDataLoader(snapshot_dir=None)
+    loader.load_data()
+    manifest = write_snapshot(directory, loader, loader.version)
+    logging.info(f"Wrote snapshot {manifest['dataset_version']} with {manifest['rows']} rows "
+                 f"to {directory} in {time.time() - started:.1f}s")
+    return manifest
+
+def main(argv=None):
+    from data_loader import SNAPSHOT_DIR
+    
+    parser = argparse.ArgumentParser(description="Build a binary snapshot of the bank dataset")
+    parser.add_argument('--output', default=SNAPSHOT_DIR, help="snapshot directory")
+    args = parser.parse_args(argv)
+    
+    logging.basicConfig(level=logging.INFO)
+    build(args.output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())